@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Program developed at Pop lab at the CBCB, University of Maryland by
+Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
+'''
+
+import argparse as ap
+
+parser = ap.ArgumentParser(description="binnacle: A tool for binning metagenomic datasets using assembly graphs and scaffolds generated by metacarvel. \
+                           Batch_Abundances.py runs Estimate_Abundances.py on all the pairs of samples of a cohort from one command, every job \
+                           runs in a new forked process. The scaffolds \
+                           of every sample are first computed with its own reads, then their abundances are estimated in the reads of the other \
+                           samples. The outputs of a sample are written to a directory named after it, ready for Collate.py.")
+parser.add_argument("-m","--manifest", help="Tab separated file with a header line and the columns Sample, Reads, Coverage, Graph and Contigs. Every row \
+gives the coverage (text, bam or bed file) of the contigs of Sample by the reads of the sample Reads. The rows where Reads is Sample also give the \
+oriented.gml and the contigs of the sample", required=True)
+parser.add_argument("-d","--dir", help="output directory for results", required=True)
+parser.add_argument("-w","--window_size", default="1500",help="Size of the sliding window for computing test statistic to identify changepoints\
+ in coverages (Default=1500)", required = False)
+parser.add_argument("-t","--threshold", default="99",help="Threshold to identify outliers (Default=99)", required = False)
+parser.add_argument("-n","--neighbor_cutoff", default="100", help="Filter size to identify outliers within (Defualt=100)", required = False)
+parser.add_argument("-p","--poscutoff", default="100",help="Position cutoff to consider delinking (Default=100)", required = False)
+parser.add_argument("-cb","--cycle_breaking", default="dfs", choices=["dfs","cycles"], help="Method to break cycles in scaffolds without a \
+starting node, see Estimate_Abundances.py (Default=dfs)", required = False)
+parser.add_argument("-mc","--max_cycles", default="", help="Number of simple cycles enumerated per scaffold with -cb cycles (Default=no limit)", required = False)
+parser.add_argument("-int","--integer_depths", action="store_true", help="Write the depths in Coverages_Before/After_Delinking.txt as integers", required = False)
+parser.add_argument("-el","--edge_list", action="store_true", help="Also write the edges of Assembly_Graph_Filtered.gml to Assembly_Graph_Filtered.tsv", required = False)
+parser.add_argument("-ct","--coverage_tracks", action="store_true", help="Also write the coverages of the scaffolds to the binary track stores", required = False)
+parser.add_argument("-kc","--keep_coverage", action="store_true", help="Write the coverages computed from bam files to disk instead of streaming them", required = False)
+parser.add_argument("-r","--resume", action="store_true", help="Skip the jobs completed by a previous run of the batch in the same output directory \
+and resume its interrupted jobs", required = False)
+parser.add_argument("-T","--threads", default="1", help="Number of jobs run at once (Default=1)", required = False)
+
+args = parser.parse_args()
+
+from Batch_Utility import *
+
+output_dir = args.dir
+if output_dir[-1] != '/': output_dir = output_dir+'/'
+if not isdir(output_dir): mkdir(output_dir)
+if(not isfile(args.manifest)):
+    print(args.manifest + " file not found")
+    sys.exit(1)
+samples = Read_Manifest(args.manifest)
+coverage_paths = [sample['coverage'] for sample in samples.values()] + [path for sample in samples.values() for reads, path in sample['cross']]
+packages = ['pandas', 'numpy'] + (['networkx'] if args.cycle_breaking == 'cycles' else [])
+if(not(Check_Dependencies(packages, Required_Tools([path for path in coverage_paths if path.endswith('.bam')], 
+                                                   [path for path in coverage_paths if path.endswith('.bed')])))):
+    print("Fix Unmet Dependencies")
+    sys.exit(1)
+params = {'window_size':int(args.window_size), 'threshold':float(args.threshold), 'neighbor_cutoff':int(args.neighbor_cutoff),
+          'poscutoff':int(args.poscutoff), 'cycle_breaking':args.cycle_breaking,
+          'max_cycles':int(args.max_cycles) if len(args.max_cycles) > 0 else None, 'integer_depths':args.integer_depths,
+          'edge_list':args.edge_list, 'tracks':args.coverage_tracks, 'keep_coverage':args.keep_coverage, 'resume':args.resume}
+threads = int(args.threads)
+
+###Batch.journal lists the jobs completed, a resumed batch skips them
+journal_path = output_dir+'Batch.journal'
+completed = set()
+if args.resume and isfile(journal_path):
+    completed = set(line.rstrip('\n') for line in open(journal_path))
+journal = open(journal_path, 'a' if args.resume else 'w')
+
+failed = set()
+for kind in ['self', 'cross']:
+    jobs = [(kind, name, sample, output_dir+name+'/', params) for name, sample in samples.items()
+            if kind+'\t'+name not in completed and name not in failed and (kind == 'self' or len(sample['cross']) > 0)]
+    print('Running '+str(len(jobs))+' '+('delinking' if kind == 'self' else 'cross sample')+' jobs')
+    for kind, name, success, seconds, error in Run_Batch(jobs, threads):
+        if success:
+            print('\t'+name+': done in %.1fs' % seconds)
+            journal.write(kind+'\t'+name+'\n')
+            journal.flush()
+        else:
+            print('\t'+name+': failed, '+error)
+            failed.add(name)
+journal.close()
+
+if len(failed) > 0:
+    print(str(len(failed))+' samples failed: '+', '.join(sorted(failed)))
+    sys.exit(1)
+print('Written Coverages')
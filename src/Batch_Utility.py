@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Program developed at Pop lab at the CBCB, University of Maryland by
+Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
+'''
+
+import time
+import contextlib
+from Compute_Contig_Coverage_Utility import *
+
+Manifest_Columns = ['Sample', 'Reads', 'Coverage', 'Graph', 'Contigs']
+
+def Read_Manifest(manifest_path):
+    '''
+    Function to read the manifest of a batch. The manifest is a tab separated file with a header line naming the
+    columns Sample, Reads, Coverage, Graph and Contigs. Every row gives the coverage of the contigs of Sample by
+    the reads of the sample Reads, as a coverage file, a bam file or a bed file. The rows where Reads is Sample
+    also give the oriented.gml and the contigs of the sample, the scaffolds of the sample are computed from them.
+    Input:
+        manifest_path: Location of the manifest
+    Output:
+        samples: Dictionary of the graph, contigs and coverage of every sample, and of the list of the read samples
+                 and coverages to estimate the abundances of its scaffolds in, in the order of the manifest
+    '''
+    df = pd.read_csv(manifest_path, sep = '\t', dtype = str, keep_default_na = False, comment = '#')
+    missing = [c for c in Manifest_Columns[:3] if c not in df.columns]
+    if len(missing) > 0:
+        print('The manifest '+manifest_path+' has no column '+', '.join(missing))
+        sys.exit(1)
+    for c in Manifest_Columns[3:]:
+        if c not in df.columns: df[c] = ''
+
+    samples = {}
+    for row in df.itertuples(index = False):
+        if not isfile(row.Coverage):
+            print(row.Coverage+" file not found")
+            sys.exit(1)
+        sample = samples.setdefault(row.Sample, {'graph':'', 'contigs':'', 'coverage':'', 'cross':[]})
+        if row.Reads == row.Sample:
+            for path in [row.Graph, row.Contigs]:
+                if not isfile(path):
+                    print('Please specify the oriented.gml and the contigs of '+row.Sample+', '+path+' file not found')
+                    sys.exit(1)
+            sample['graph'], sample['contigs'], sample['coverage'] = row.Graph, row.Contigs, row.Coverage
+        else:
+            sample['cross'].append((row.Reads, row.Coverage))
+    for name, sample in samples.items():
+        if sample['coverage'] == '':
+            print('The manifest has no row with the coverage of '+name+' by its own reads')
+            sys.exit(1)
+    return samples
+
+def Resolve_Sample_Coverage(path, contigs_path, output_dir, prefix, keep_coverage, length_path=''):
+    '''
+    Function to find how the coverage of a pair of samples is read, from the extension of its file.
+    Input:
+        path: Coverage file, bam file or bed file of the pair
+        contigs_path: The contigs the reads were aligned to
+        output_dir: Location to write the coverages computed from bam and bed files to
+        prefix: Prefix of the coverage file written
+        keep_coverage: Write the coverage of a bam file to disk instead of streaming it
+        length_path: Genome file of the contigs for bed files, written from contigs_path when empty
+    Output:
+        coverage_path, coverage_cmd: See Load_Sample_Coverage
+    '''
+    if path.endswith('.bam'):
+        if keep_coverage:
+            return Get_Coverage_BAM(path, output_dir, prefix), ""
+        return "", Get_Coverage_BAM_Command(path, output_dir)
+    if path.endswith('.bed'):
+        if length_path == '':
+            length_path = output_dir+prefix+'.length.txt'
+            Write_Length_File(contigs_path, '', length_path)
+        return Get_Coverage_Bed(path, length_path, output_dir, prefix), ""
+    return path, ""
+
+def Run_Self_Job(name, sample, output_dir, params):
+    '''
+    Function to compute the scaffolds of a sample with its own reads, as Estimate_Abundances.py does without
+    coordinates.
+    Input:
+        name: Name of the sample, the prefix of its summary
+        sample: The sample as returned by Read_Manifest
+        output_dir: Directory to write the outputs of the sample to
+        params: Dictionary of the parameters of Write_Coverage_Outputs and of keep_coverage
+    '''
+    G = Load_Assembly_Graph(sample['graph'])
+    coverage_path, coverage_cmd = Resolve_Sample_Coverage(sample['coverage'], sample['contigs'], output_dir, name,
+                                                          params['keep_coverage'])
+    read_coverage, df_not_found_summary = Load_Sample_Coverage(coverage_path, coverage_cmd, G.labels)
+    journal_path = output_dir+'Coverage_Outputs.journal'
+    Write_Coverage_Outputs(G, read_coverage, output_dir, params['window_size'], params['threshold'], params['neighbor_cutoff'],
+                           params['poscutoff'], name, 1, params['integer_depths'], params['cycle_breaking'], params['max_cycles'],
+                           params['edge_list'], None, journal_path, params['resume'], tracks = params['tracks'],
+                           input_paths = [sample['graph'], sample['coverage'], sample['contigs']])
+    del G, read_coverage
+    remove(journal_path)
+    Append_Removed_Contigs(output_dir, df_not_found_summary, name)
+    Write_Scaffolds(sample['contigs'], output_dir+'Coords_After_Delinking.txt', output_dir+'Scaffolds.fasta')
+
+def Run_Cross_Jobs(name, sample, output_dir, params):
+    '''
+    Function to estimate the abundances of the scaffolds of a sample in all the other samples of the manifest.
+    The layout of the scaffolds and the genome file of the contigs are loaded once for all the read samples.
+    Input:
+        name: Name of the sample
+        sample: The sample as returned by Read_Manifest
+        output_dir: Directory with the outputs of Run_Self_Job on the sample
+        params: Dictionary with keep_coverage
+    '''
+    layout = Load_Scaffold_Layout(output_dir+'Coords_After_Delinking.txt')
+    length_path = ''
+    if any(path.endswith('.bed') for reads, path in sample['cross']):
+        length_path = output_dir+name+'.length.txt'
+        Write_Length_File(sample['contigs'], '', length_path)
+    samples = []
+    for reads, path in sample['cross']:
+        coverage_path, coverage_cmd = Resolve_Sample_Coverage(path, sample['contigs'], output_dir, reads,
+                                                              params['keep_coverage'], length_path)
+        samples.append((reads, coverage_path, coverage_cmd))
+    Estimate_Scaffold_Coverage_Samples(samples, layout, output_dir)
+
+def Run_Batch_Job(job):
+    '''
+    Function to run a job of the batch and log its output to batch.log in the output directory of its sample.
+    A job that fails is reported instead of stopping the batch.
+    Input:
+        job: Tuple of the kind of job, self or cross, the name of the sample, the sample, its output directory
+             and the parameters
+    Output:
+        status: Tuple of the kind, the name, whether the job succeeded, its running time and the error
+    '''
+    kind, name, sample, output_dir, params = job
+    if not isdir(output_dir): mkdir(output_dir)
+    start = time.perf_counter()
+    error = ''
+    with open(output_dir+'batch.log', 'a') as log, contextlib.redirect_stdout(log):
+        try:
+            if kind == 'self':
+                Run_Self_Job(name, sample, output_dir, params)
+            else:
+                Run_Cross_Jobs(name, sample, output_dir, params)
+        except SystemExit:
+            error = 'see '+output_dir+'batch.log'
+        except Exception as e:
+            error = repr(e)
+            print(error)
+    return kind, name, error == '', time.perf_counter() - start, error
+
+def Run_Batch(jobs, threads=1):
+    '''
+    Function to run jobs of a batch in a pool of forked processes, also when threads is 1. Every job runs in a 
+    new process so the memory of a sample is released before the next one.
+    Input:
+        jobs: List of jobs, see Run_Batch_Job
+        threads: Number of jobs run at once
+    Output:
+        Iterator over the status of the jobs as they complete
+    '''
+    if len(jobs) == 0:
+        return
+    with mp.get_context('fork').Pool(max(1, min(threads, len(jobs))), maxtasksperchild = 1) as pool:
+        for status in pool.imap_unordered(Run_Batch_Job, jobs):
+            yield status
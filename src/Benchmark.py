@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Program developed at Pop lab at the CBCB, University of Maryland by
+Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
+'''
+
+import argparse as ap
+
+parser = ap.ArgumentParser(description="binnacle: A tool for binning metagenomic datasets using assembly graphs and scaffolds generated by metacarvel. \
+                           Benchmark.py generates synthetic assembly graphs, contigs and coverages at several sizes, runs the binnacle pipeline on them \
+                           and records the running time and peak memory of every stage. The results can be saved as a baseline and later runs compared against it.")
+parser.add_argument("-d","--dir", help="Directory for the synthetic datasets, the outputs and the results", required=True)
+parser.add_argument("-s","--sizes", default="10000", help="Comma separated numbers of contigs of the datasets, for instance 10000,100000,1000000 (Default=10000)", required=False)
+parser.add_argument("-seed","--seed", default="0", help="Seed of the synthetic datasets (Default=0)", required=False)
+parser.add_argument("-cd","--component_distribution", default="geometric", choices=["geometric","powerlaw"], help="Distribution of the sizes of the \
+connected components (Default=geometric)", required=False)
+parser.add_argument("-cp","--component_parameter", default="4", help="Mean size of the components for geometric, exponent (>1) for powerlaw (Default=4)", required=False)
+parser.add_argument("-mx","--max_component", default="1000", help="Largest number of contigs in a component (Default=1000)", required=False)
+parser.add_argument("-cy","--cycle_fraction", default="0.05", help="Fraction of the components with a cycle (Default=0.05)", required=False)
+parser.add_argument("-eo","--edge_orientations", default="1,1,1,1", help="Relative frequency of the EE,EB,BB,BE edges (Default=1,1,1,1)", required=False)
+parser.add_argument("-bp","--breakpoint_fraction", default="0.1", help="Fraction of the components with a coverage breakpoint (Default=0.1)", required=False)
+parser.add_argument("-u","--unplaced_fraction", default="0.1", help="Fraction of the contigs that are not in the graph (Default=0.1)", required=False)
+parser.add_argument("-ns","--num_samples", default="2", help="Number of samples whose abundances are estimated on the scaffolds and collated (Default=2)", required=False)
+parser.add_argument("-w","--window_size", default="1500",help="Size of the sliding window for computing test statistic to identify changepoints (Default=1500)", required=False)
+parser.add_argument("-T","--threads", default="1", help="Number of processes used to compute the coverages of the connected components (Default=1)", required=False)
+parser.add_argument("-b","--baseline", default="", help="Results of a previous run to compare the outputs and running times against", required=False)
+parser.add_argument("-tol","--tolerance", default="1.5", help="Ratio of the running time of a stage to the baseline above which it is reported as slower (Default=1.5)", required=False)
+args = parser.parse_args()
+
+from Benchmark_Utility import *
+
+bench_dir = args.dir
+if bench_dir[-1] != '/': bench_dir = bench_dir+'/'
+if not isdir(bench_dir): mkdir(bench_dir)
+threads = int(args.threads)
+weights = [float(w) for w in args.edge_orientations.split(',')]
+if len(weights) != 4:
+    print('Please specify the frequency of the 4 edge orientations EE,EB,BB,BE')
+    sys.exit(1)
+
+###The baseline is loaded before running, it may be the results.json the results are written to
+baseline = None
+if args.baseline != "":
+    if(not isfile(args.baseline)):
+        print(args.baseline + " file not found")
+        sys.exit(1)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+runs = []
+for size in args.sizes.split(','):
+    num_contigs = int(size)
+    data_dir = bench_dir+'data_'+str(num_contigs)+'_'+args.seed+'/'
+    print('Generating '+str(num_contigs)+' contigs in '+data_dir)
+    dataset = Generate_Synthetic_Dataset(data_dir, num_contigs, int(args.seed), args.component_distribution,
+                                         float(args.component_parameter), int(args.max_component), float(args.cycle_fraction),
+                                         weights, float(args.breakpoint_fraction), float(args.unplaced_fraction), int(args.num_samples))
+    print('Running binnacle on '+str(num_contigs)+' contigs')
+    run = Run_Benchmark(dataset, bench_dir+'run_'+str(num_contigs)+'/', threads, int(args.window_size))
+    for name, stage in run['stages'].items():
+        line = '\t'+name+'\t%.2fs' % stage['seconds']
+        if 'peak_mb' in stage: line += '\t%.0f MB' % stage['peak_mb']
+        if 'workers_peak_mb' in stage: line += '\tworkers %.0f MB' % stage['workers_peak_mb']
+        print(line)
+    runs.append(run)
+
+with open(bench_dir+'results.json', 'w') as f:
+    json.dump({'runs':runs}, f, indent = 1)
+print('Written the results to '+bench_dir+'results.json')
+
+if baseline is not None:
+    if Compare_To_Baseline(runs, baseline['runs'], float(args.tolerance)) > 0:
+        sys.exit(1)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Program developed at Pop lab at the CBCB, University of Maryland by
+Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
+'''
+
+import json
+import contextlib
+from Clustering_Utility import *
+
+Dataset_Version = 1
+
+def Generate_Component_Sizes(num_nodes, distribution, parameter, max_size, rng):
+    '''
+    Function to draw the sizes of the connected components of a synthetic assembly graph.
+    Input:
+        num_nodes: Number of contigs in the graph
+        distribution: geometric or powerlaw
+        parameter: Mean size of the components for geometric, exponent of the distribution for powerlaw
+        max_size: Largest size of a component
+        rng: numpy random generator
+    Output:
+        sizes: Array of component sizes adding up to num_nodes
+    '''
+    sizes = []
+    total = 0
+    while total < num_nodes:
+        batch = max(1024, int((num_nodes - total)/max(parameter, 1.0)))
+        if distribution == 'powerlaw':
+            s = rng.zipf(parameter, batch)
+        else:
+            s = rng.geometric(1.0/parameter, batch)
+        s = np.minimum(s, max_size)
+        sizes.append(s)
+        total += int(s.sum())
+    sizes = np.concatenate(sizes).astype(np.int64)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), num_nodes)+1]
+    sizes[-1] -= int(sizes.sum()) - num_nodes
+    return sizes[sizes > 0]
+
+def Write_Synthetic_GML(graph_path, lengths, reverse, sources, targets, orientation, mean, stdev, bsize, chunk=100000):
+    '''
+    Function to write a synthetic graph in the format of the oriented.gml written by MetaCarvel.
+    Input:
+        graph_path: Location of the GML file
+        lengths, reverse: Length and orientation of the contigs k141_1..k141_n
+        sources, targets, orientation, mean, stdev, bsize: Edges and their attributes
+    '''
+    with open(graph_path, 'w') as f:
+        f.write('graph [\n  directed 1\n')
+        for lo in range(0, len(lengths), chunk):
+            f.write(''.join('  node [\n    id %d\n    label "k141_%d"\n    orientation "%s"\n    length "%d"\n  ]\n' %
+                            (i, i+1, 'REV' if r else 'FOW', l)
+                            for i, l, r in zip(range(lo, lo+chunk), lengths[lo:lo+chunk].tolist(), reverse[lo:lo+chunk].tolist())))
+        for lo in range(0, len(sources), chunk):
+            hi = lo + chunk
+            f.write(''.join('  edge [\n    source %d\n    target %d\n    orientation "%s"\n    mean "%.1f"\n    stdev "%.1f"\n    bsize "%d"\n  ]\n' % e
+                            for e in zip(sources[lo:hi].tolist(), targets[lo:hi].tolist(),
+                                         [Edge_Orientations[o] for o in orientation[lo:hi].tolist()],
+                                         mean[lo:hi].tolist(), stdev[lo:hi].tolist(), bsize[lo:hi].tolist())))
+        f.write(']\n')
+
+def Write_Synthetic_Coverage(coverage_path, lengths, depths, run_length, rng, chunk=200000):
+    '''
+    Function to write the -bga coverage of the contigs, as runs of run_length bases whose depth is drawn
+    around the depth of their contig.
+    Input:
+        coverage_path: Location of the coverage file
+        lengths: Length of the contigs k141_1..k141_n
+        depths: Expected depth of each contig
+        run_length: Length of the runs
+        rng: numpy random generator
+    '''
+    with open(coverage_path, 'w') as f:
+        for lo in range(0, len(lengths), chunk):
+            L = lengths[lo:lo+chunk]
+            num_runs = (L + run_length - 1)//run_length
+            contig = np.repeat(np.arange(len(L)), num_runs)
+            first = np.cumsum(num_runs) - num_runs
+            start = (np.arange(len(contig)) - first[contig])*run_length
+            end = np.minimum(start + run_length, L[contig])
+            depth = rng.poisson(depths[lo:lo+chunk][contig])
+            depth[rng.random(len(depth)) < 0.02] = 0
+            df = pd.DataFrame({'ContigID':np.char.add('k141_', (contig + lo + 1).astype(str)),
+                               'Start':start, 'End':end, 'Coverage':depth})
+            df.to_csv(f, sep = '\t', header = False, index = False)
+
+def Write_Synthetic_Contigs(contigs_path, lengths, rng, chunk=10000):
+    '''
+    Function to write random sequences for the contigs, one line per sequence.
+    Input:
+        contigs_path: Location of the fasta file
+        lengths: Length of the contigs k141_1..k141_n
+        rng: numpy random generator
+    '''
+    bases = np.frombuffer(b'ACGT', dtype = np.uint8)
+    with open(contigs_path, 'wb') as f:
+        for lo in range(0, len(lengths), chunk):
+            L = lengths[lo:lo+chunk]
+            seq = bases[rng.integers(0, 4, int(L.sum()))].tobytes()
+            offsets = np.concatenate(([0], np.cumsum(L))).tolist()
+            f.write(b''.join(b'>k141_%d\n%s\n' % (lo+i+1, seq[offsets[i]:offsets[i+1]]) for i in range(len(L))))
+
+def Generate_Synthetic_Dataset(data_dir, num_contigs, seed=0, component_distribution='geometric', component_parameter=4.0,
+                               max_component=1000, cycle_fraction=0.05, orientation_weights=(1, 1, 1, 1),
+                               breakpoint_fraction=0.1, unplaced_fraction=0.1, num_samples=2, min_length=500,
+                               max_length=5000, run_length=250):
+    '''
+    Function to generate a synthetic dataset in the formats read by binnacle: an oriented.gml as written by
+    MetaCarvel, a -bga coverage file for the sample the graph was built from and for num_samples other samples,
+    and the contigs. The graph is made of random trees, a fraction of which are turned into directed cycles
+    by linking their last contig back to their root. A fraction of the components have a coverage breakpoint,
+    the contigs in the second half of the component have their depth scaled, so that binnacle delinks them.
+    A dataset already generated in data_dir with the same parameters is reused.
+    Input:
+        data_dir: Directory to write the dataset to
+        num_contigs: Number of contigs, including the unplaced_fraction of contigs that are not in the graph
+        seed: Seed of the random generator, the dataset is a deterministic function of the parameters
+        component_distribution, component_parameter, max_component: See Generate_Component_Sizes
+        cycle_fraction: Fraction of the components with three contigs or more that contain a cycle
+        orientation_weights: Relative frequency of the EE, EB, BB and BE edges
+        breakpoint_fraction: Fraction of the components with a coverage breakpoint
+        unplaced_fraction: Fraction of the contigs that are not in the graph
+        num_samples: Number of samples besides the one the graph was built from
+        min_length, max_length: Range of the contig lengths
+        run_length: Length of the runs in the coverage files
+    Output:
+        dataset: Dictionary with the parameters and the paths to the graph, the contigs and the coverage files
+    '''
+    params = {'version':Dataset_Version, 'num_contigs':int(num_contigs), 'seed':int(seed),
+              'component_distribution':component_distribution, 'component_parameter':float(component_parameter),
+              'max_component':int(max_component), 'cycle_fraction':float(cycle_fraction),
+              'orientation_weights':[float(w) for w in orientation_weights], 'breakpoint_fraction':float(breakpoint_fraction),
+              'unplaced_fraction':float(unplaced_fraction), 'num_samples':int(num_samples), 'min_length':int(min_length),
+              'max_length':int(max_length), 'run_length':int(run_length)}
+    if data_dir[-1] != '/': data_dir = data_dir+'/'
+    if not isdir(data_dir): mkdir(data_dir)
+    dataset = {'params':params, 'graph':data_dir+'oriented.gml', 'contigs':data_dir+'contigs.fa',
+               'coverage':[data_dir+'sample_'+str(s)+'.txt' for s in range(num_samples+1)]}
+    if isfile(data_dir+'dataset.json'):
+        with open(data_dir+'dataset.json') as f:
+            if json.load(f) == params:
+                return dataset
+
+    rng = np.random.default_rng(seed)
+    num_graph = num_contigs - int(num_contigs*unplaced_fraction)
+    sizes = Generate_Component_Sizes(num_graph, component_distribution, component_parameter, max_component, rng)
+    component = np.repeat(np.arange(len(sizes)), sizes)
+    first = np.cumsum(sizes) - sizes
+    local = np.arange(num_graph) - first[component]
+
+    ###Every contig but the root of its component is linked to a random contig before it
+    children = np.flatnonzero(local > 0)
+    parents = first[component[children]] + (rng.random(len(children))*local[children]).astype(np.int64)
+    cyclic = (sizes >= 3) & (rng.random(len(sizes)) < cycle_fraction)
+    flip = (rng.random(len(children)) < 0.5) & ~cyclic[component[children]]
+    sources = np.where(flip, children, parents)
+    targets = np.where(flip, parents, children)
+    cycle_components = np.flatnonzero(cyclic)
+    sources = np.concatenate((sources, first[cycle_components] + sizes[cycle_components] - 1))
+    targets = np.concatenate((targets, first[cycle_components]))
+    weights = np.asarray(orientation_weights, dtype = np.float64)
+    orientation = rng.choice(4, size = len(sources), p = weights/weights.sum())
+    mean = np.round(rng.uniform(-200, 50, len(sources)), 1)
+    stdev = np.round(rng.uniform(1, 50, len(sources)), 1)
+    bsize = rng.integers(3, 30, len(sources))
+
+    lengths = rng.integers(min_length, max_length+1, num_contigs)
+    reverse = rng.random(num_graph) < 0.5
+    Write_Synthetic_GML(dataset['graph'], lengths[:num_graph], reverse, sources, targets, orientation, mean, stdev, bsize)
+    Write_Synthetic_Contigs(dataset['contigs'], lengths, rng)
+
+    breakpoint = (sizes >= 2) & (rng.random(len(sizes)) < breakpoint_fraction)
+    scale = np.ones(num_contigs)
+    shifted = breakpoint[component] & (local >= sizes[component]//2)
+    scale[:num_graph][shifted] = np.where(rng.random(len(sizes)) < 0.5, 0.2, 5.0)[component[shifted]]
+    for path in dataset['coverage']:
+        abundance = rng.lognormal(3, 1, len(sizes) + num_contigs - num_graph)
+        depths = np.concatenate((abundance[component], abundance[len(sizes):]))*scale
+        Write_Synthetic_Coverage(path, lengths, depths, run_length, rng)
+
+    with open(data_dir+'dataset.json', 'w') as f:
+        json.dump(params, f)
+    return dataset
+
+def File_Checksums(paths):
+    '''
+    Function to compute the md5 of the output files of a run, to compare the results against a baseline.
+    Input:
+        paths: Dictionary of the files to checksum
+    Output:
+        checksums: Dictionary of the md5 of the files that exist
+    '''
+    checksums = {}
+    for name, path in paths.items():
+        if isfile(path):
+            md5 = hashlib.md5()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    md5.update(block)
+            checksums[name] = md5.hexdigest()
+    return checksums
+
+def Run_Benchmark(dataset, output_dir, threads=1, window_size=1500):
+    '''
+    Function to run binnacle on a synthetic dataset the way Estimate_Abundances.py and Collate.py do: the
+    scaffolds are computed from the graph and the first sample, the abundances of the scaffolds are estimated
+    in the other samples and the summaries are collated into the metabat feature matrix.
+    Input:
+        dataset: Dataset returned by Generate_Synthetic_Dataset
+        output_dir: Directory to write the outputs of binnacle to
+        threads: Number of processes computing the coverages of the components
+        window_size: Size of the sliding window of the changepoint detection
+    Output:
+        run: Dictionary with the parameters of the dataset, the time and peak memory of every stage and the
+             checksums of the outputs
+    '''
+    if output_dir[-1] != '/': output_dir = output_dir+'/'
+    if not isdir(output_dir): mkdir(output_dir)
+    for f in listdir(output_dir):
+        if f.endswith('_Summary.txt'): remove(output_dir+f)
+    metrics = Metrics(quiet = True, memory = True)
+    with open(output_dir+'binnacle.log', 'w') as log, contextlib.redirect_stdout(log):
+        with metrics.stage('Load_Assembly_Graph'):
+            G = Load_Assembly_Graph(dataset['graph'], '')
+        with metrics.stage('Load_Read_Coverage'):
+            read_coverage, df_not_found = Load_Read_Coverage(dataset['coverage'][0], G.labels)
+        with metrics.stage('Write_Coverage_Outputs'):
+            Write_Coverage_Outputs(G, read_coverage, output_dir, window_size, prefix = 'sample_0', threads = threads, 
+                                   metrics = metrics)
+        del G, read_coverage
+        with metrics.stage('Append_Removed_Contigs'):
+            Append_Removed_Contigs(output_dir, df_not_found, 'sample_0')
+        if isfile(dataset['contigs']+'.fai'): remove(dataset['contigs']+'.fai')
+        with metrics.stage('Write_Scaffolds'):
+            Write_Scaffolds(dataset['contigs'], output_dir+'Coords_After_Delinking.txt', output_dir+'Scaffolds.fasta')
+        with metrics.stage('Load_Scaffold_Layout'):
+            layout = Load_Scaffold_Layout(output_dir+'Coords_After_Delinking.txt', '')
+        samples = [('sample_'+str(s), path, '') for s, path in enumerate(dataset['coverage']) if s > 0]
+        with metrics.stage('Estimate_Scaffold_Coverage_Samples'):
+            Estimate_Scaffold_Coverage_Samples(samples, layout, output_dir)
+        with metrics.stage('Collate'):
+            df_summary = Format_Outputs(output_dir, 'metabat')
+        with metrics.stage('Write_Feature_Matrix'):
+            df_summary.to_csv(output_dir+'Feature-Matrix-metabat.txt', sep = '\t')
+
+    ###The time spent in the steps of the components is reported as stages within Write_Coverage_Outputs
+    stages = dict((name, stage) for name, stage in metrics.stages.items() if name != 'Components')
+    for key, value in metrics.stages.get('Components', {}).items():
+        if key.endswith('_s'): stages['Write_Coverage_Outputs/'+key[:-2]] = {'seconds':value}
+    outputs = dict((f, output_dir+f) for f in ['Coords_After_Delinking.txt', 'Coverages_After_Delinking.txt',
+                   'Assembly_Graph_Filtered.gml', 'Cycle_Breaking_Edges.txt', 'Scaffolds.fasta', 'sample_0_Summary.txt',
+                   'Feature-Matrix-metabat.txt'])
+    return {'params':dataset['params'], 'threads':threads, 'stages':stages, 'checksums':File_Checksums(outputs)}
+
+def Compare_To_Baseline(runs, baseline_runs, tolerance=1.5, min_seconds=0.5):
+    '''
+    Function to compare the runs of a benchmark to the runs of a baseline on the same datasets.
+    Input:
+        runs: Runs returned by Run_Benchmark
+        baseline_runs: Runs of the baseline
+        tolerance: Ratio of the running times above which a stage is reported as slower
+        min_seconds: Stages faster than this in the baseline are not reported as slower
+    Output:
+        failures: Number of runs whose outputs differ from the baseline or with a slower stage
+    '''
+    failures = 0
+    for run in runs:
+        matches = [b for b in baseline_runs if b['params'] == run['params']]
+        size = str(run['params']['num_contigs'])
+        if len(matches) == 0:
+            print(size+' contigs: no baseline run on this dataset')
+            continue
+        base = matches[0]
+        failed = False
+        for name, checksum in run['checksums'].items():
+            if base['checksums'].get(name) != checksum:
+                print(size+' contigs: '+name+' differs from the baseline')
+                failed = True
+        for name, stage in run['stages'].items():
+            if name not in base['stages']:
+                continue
+            ratio = stage['seconds']/max(base['stages'][name]['seconds'], 1e-9)
+            line = size+' contigs: '+name+' '+'%.2fs vs %.2fs (x%.2f)' % (stage['seconds'], base['stages'][name]['seconds'], ratio)
+            if 'peak_mb' in stage and 'peak_mb' in base['stages'][name]:
+                line += ', peak %.0f MB vs %.0f MB' % (stage['peak_mb'], base['stages'][name]['peak_mb'])
+            if ratio > tolerance and base['stages'][name]['seconds'] >= min_seconds:
+                line += ' SLOWER'
+                failed = True
+            print(line)
+        failures += failed
+    return failures
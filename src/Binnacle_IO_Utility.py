@@ -7,211 +7,965 @@ Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
 '''
 
 import io
+import re
+import mmap
+import shutil
+import html
+import hashlib
+import zipfile
+import sys
+import time
 import subprocess
-import Bio as bio
-from Bio import SeqIO
-from os import remove, mkdir, listdir
-from os.path import isfile, isdir, split
+import multiprocessing as mp
+from os import remove, mkdir, listdir, stat, fsync, replace, getpid
+from os.path import isfile, isdir, split, abspath
 from Compute_Scaffold_Coverages_Utility import *
+from Metrics_Utility import *
+from Coverage_Tracks_Utility import *
 
-def Load_Read_Coverage(covpath, nodes, opdir, prefix=""):
+def Load_Read_Coverage(covpath, nodes, chunksize=4000000):
     '''
-    Function to return a dataframe contiaing the coverage generated by genomecov -d of the bedtools 
-    suite whose index is the contig id.
+    Function to load the coverage generated by genomecov -bga of the bedtools suite in a single pass. 
+    The records of contigs in the graph are stored in contiguous int32 arrays with a per contig offset 
+    table, the records of the remaining contigs are summarized as they are not part of any scaffold. 
+    The file does not need to be sorted, the records of a contig do not even need to be contiguous. 
     Input:
-        covpath: Location on the computer where the coverage file is present
+        covpath: Location on the computer where the coverage file is present, or a file object to read it from
         nodes: List of nodes in the graph
-        opdir: Location of the output directory where the outputs are written to. 
+        chunksize: Number of records parsed at a time
     Output:
-        df_coverage: the dataframe contianing the coverage signals
-    '''
-    nodes.sort()
-    node_list_str = '\n'.join(nodes)
-    f = open(opdir+prefix+'_Temp_Node_List.txt','w')
-    f.write(node_list_str)
-    f.close()
-
-    temp_cov_path = opdir+prefix+'_Temp_Cov.txt'
-    command = 'LANG=en_EN join '+opdir+prefix+'_Temp_Node_List.txt '+covpath+' > '+temp_cov_path
-    result = subprocess.getoutput(command)
-    temp_not_found_path = opdir+prefix+'_Temp_Not_Found.txt'
-    command = 'awk \'NR==FNR{c[$1]++;next};c[$1] == 0\' ' +  opdir+prefix+'_Temp_Node_List.txt '+covpath+ ' > '+temp_not_found_path
-    result = subprocess.getoutput(command)
-
-    df_not_found = pd.read_csv(temp_not_found_path, sep = '\t', names = ['ContigID','Start','End','Coverage'],
-                               low_memory = False, memory_map = True, engine='c',
-                               dtype = {'Contig': str, 'Start': 'int32','End':'int32', 'coverage': 'int32'})
+        read_coverage: Dictionary with the contigs (a pandas Index) and their offsets into the starts, ends 
+                       and depths arrays. The intervals of contigs[i] are at offsets[i]:offsets[i+1].
+        df_not_found_summary: Summary of the coverages of the contigs not in the graph
+    '''
+    node_index = pd.Index(nodes)
+    codes, starts, ends, depths, not_found = [], [], [], [], []
+    reader = pd.read_csv(covpath, sep = '\t', names = ['ContigID','Start','End','Coverage'], header = None,
+                         dtype = {'ContigID': str, 'Start': 'int32','End':'int32', 'Coverage': 'int32'},
+                         engine = 'c', chunksize = chunksize)
+    for chunk in reader:
+        code = node_index.get_indexer(chunk['ContigID'])
+        ingraph = code >= 0
+        codes.append(code[ingraph].astype(np.int32))
+        starts.append(chunk['Start'].values[ingraph])
+        ends.append(chunk['End'].values[ingraph])
+        depths.append(chunk['Coverage'].values[ingraph])
+        not_found.append(chunk[~ingraph])
+
+    codes = np.concatenate(codes) if len(codes) > 0 else np.zeros(0, dtype = np.int32)
+    starts = np.concatenate(starts) if len(starts) > 0 else np.zeros(0, dtype = np.int32)
+    ends = np.concatenate(ends) if len(ends) > 0 else np.zeros(0, dtype = np.int32)
+    depths = np.concatenate(depths) if len(depths) > 0 else np.zeros(0, dtype = np.int32)
+    ###The contigs and their intervals can be in any order in the file, the records are bucketed by contig 
+    ###and sorted by start within a contig unless they already are.
+    same = codes[1:] == codes[:-1]
+    boundaries = np.flatnonzero(~same) + 1
+    run_codes = codes[np.concatenate(([0], boundaries))] if len(codes) > 0 else codes
+    if len(np.unique(run_codes)) != len(run_codes) or np.any(starts[1:][same] < starts[:-1][same]):
+        order = np.lexsort((starts, codes))
+        codes, starts, ends, depths = codes[order], starts[order], ends[order], depths[order]
+        boundaries = np.flatnonzero(np.diff(codes)) + 1
+        run_codes = codes[np.concatenate(([0], boundaries))]
+    contigs = node_index[run_codes]
+    read_coverage = {'contigs':contigs,
+                     'offsets':np.concatenate(([0], boundaries, [len(codes)])).astype(np.int64), 
+                     'starts':starts, 'ends':ends, 'depths':depths}
+
+    if len(not_found) > 0: df_not_found = pd.concat(not_found).sort_values(['ContigID', 'Start'], kind = 'mergesort')
+    else: df_not_found = pd.DataFrame(columns = ['ContigID','Start','End','Coverage'])
     df_not_found_summary = Summarize_Coverages(df_not_found)
+    return read_coverage, df_not_found_summary
 
-    df_coverage = pd.read_csv(temp_cov_path,names = ['Contig','Start','End','coverage'], 
-                              sep = ' ', low_memory = False, memory_map = True, 
-                              dtype = {'Contig': str, 'Start': 'int32','End':'int32', 'coverage': 'int32'},
-                              engine='c', index_col = 'Contig')
-    remove(opdir+prefix+'_Temp_Node_List.txt')
-    remove(temp_cov_path)
-    remove(temp_not_found_path)
-    
-    return df_coverage, df_not_found_summary
+def Stream_Read_Coverage(cov_cmd, nodes):
+    '''
+    Function to load the coverage written to the standard output of a command, such as genomeCoverageBed, 
+    without writing it to a file. 
+    Input:
+        cov_cmd: Shell command writing the coverage to its standard output, run by bash with pipefail so that 
+                 a failure of any command of a pipeline fails the run
+        nodes: List of nodes in the graph
+    Output:
+        read_coverage, df_not_found_summary: See Load_Read_Coverage
+    '''
+    print('Streaming the coverages from '+cov_cmd)
+    proc = subprocess.Popen(['bash', '-o', 'pipefail', '-c', cov_cmd], stdout = subprocess.PIPE)
+    read_coverage, df_not_found_summary = Load_Read_Coverage(proc.stdout, nodes)
+    proc.stdout.close()
+    if proc.wait() != 0:
+        print('Failed to compute the coverages with '+cov_cmd)
+        sys.exit(1)
+    return read_coverage, df_not_found_summary
 
-def Compress_Coverage_Vector(Coverage, id_before_delinking, id_after_delinking=''):
+def Load_Sample_Coverage(coverage_path, coverage_cmd, nodes):
     '''
-    Function to compress a coverage vector, similar to the BGA split format.
+    Function to load the coverage of a sample from the standard output of coverage_cmd if it is given, 
+    from the coverage file otherwise. 
     Input:
-        Coverage: Coverage vector of the scaffold
-        id_before_delinking: scaffold id before delinking based on chnagepoints
-        id_after_delinking: scaffold id of the scaffold under study
+        coverage_path: The output of running genomeCoverageBed with -bga -split flags
+        coverage_cmd: Command writing the coverage to its standard output, or an empty string
+        nodes: List of nodes in the graph
     Output:
-        out_mat: Returns the compresed coverage matrix. 
-    '''
-    out_mat = ''
-    start = 0
-    Coverage = list(Coverage) +[-100]
-    for i in range(0, len(Coverage)-1):
-        curr = Coverage[i]
-        nxt = Coverage[i+1]
-        if curr != nxt:
-            if id_after_delinking == '':
-                o = str(id_before_delinking)+'\t'+str(start)+'\t'+str(i+1)+'\t'+str(curr)+'\n'
-            else:
-                o = str(id_after_delinking)+'\t'+str(id_before_delinking)+'\t'+str(start)+'\t'+str(i+1)+'\t'+str(curr)+'\n'
-            out_mat = out_mat+o
-            start = i+1
-    return out_mat
+        read_coverage, df_not_found_summary: See Load_Read_Coverage
+    '''
+    if len(coverage_cmd) > 0:
+        return Stream_Read_Coverage(coverage_cmd, nodes)
+    return Load_Read_Coverage(coverage_path, nodes)
 
-def Write_Coverage_Outputs(graph,df_coverage, outdir, window_size=1500, outlier_thresh=99, 
-                           neighbors_outlier_filter=100, poscutoff=100,prefix = ""):
+GML_Node_Attributes = ['orientation', 'length']
+GML_Edge_Attributes = ['orientation', 'mean', 'stdev', 'bsize']
+GML_Token = re.compile(r'"[^"]*"|\[|\]|[^\s\[\]"]+')
+GML_Cache_Version = 1
+
+def Parse_GML_File(graph_path):
     '''
-    Wrapper function to compute coverages and write outputs to. 
+    Function to stream the oriented.gml generated by MetaCarvel and retain only the attributes used by binnacle. 
+    The attribute values are kept as the tokens in the file, quotes included, so that they can be converted 
+    the same way networkx does. 
     Input:
-        graph: The oriented.gml created by MetaCarvel
-        df_coverage: the dataframe contianing the coverage signals
-        outdir: The directory to write the outputs to 
+        graph_path: Location of the oriented.gml file
+    Output:
+        gml: Dictionary of arrays with the node labels, the source and target node of each edge and the tokens 
+             of the node and edge attributes
     '''
+    labels, ids = [], {}
+    node_attrs = dict((a, []) for a in GML_Node_Attributes)
+    edge_attrs = dict((a, []) for a in GML_Edge_Attributes)
+    sources, targets = [], []
+    blocks, key, record = [], None, None
+    with open(graph_path) as f:
+        for line in f:
+            for token in GML_Token.findall(line):
+                if token == '[':
+                    blocks.append(key)
+                    key = None
+                    if len(blocks) == 2 and blocks[1] in ('node', 'edge'):
+                        record = {}
+                elif token == ']':
+                    if len(blocks) == 2 and blocks[1] == 'node':
+                        ids[record['id']] = len(labels)
+                        labels.append(record['label'][1:-1])
+                        for a in GML_Node_Attributes: node_attrs[a].append(record.get(a, '""'))
+                    elif len(blocks) == 2 and blocks[1] == 'edge':
+                        sources.append(record['source'])
+                        targets.append(record['target'])
+                        for a in GML_Edge_Attributes: edge_attrs[a].append(record.get(a, '""'))
+                    blocks.pop()
+                elif key is None:
+                    key = token
+                else:
+                    if len(blocks) == 2 and blocks[1] in ('node', 'edge'):
+                        record[key] = token
+                    key = None
+    gml = {'labels':np.array(labels, dtype = bytes), 
+           'sources':np.array([ids[u] for u in sources], dtype = np.int64),
+           'targets':np.array([ids[v] for v in targets], dtype = np.int64)}
+    for a in GML_Node_Attributes: gml['node_'+a] = np.array(node_attrs[a], dtype = bytes)
+    for a in GML_Edge_Attributes: gml['edge_'+a] = np.array(edge_attrs[a], dtype = bytes)
+    return gml
 
-    if not isdir(outdir):
-        mkdir(outdir)
-        
-    weakly_connected_components = nx.weakly_connected_components(graph)
-    
-    coverage_before_delinking = io.FileIO(outdir +'Coverages_Before_Delinking.txt', 'w')
-    coords_before_delinking = io.FileIO(outdir + 'Coords_Before_Delinking.txt', 'w')
-    coverage_after_delinking = io.FileIO(outdir + 'Coverages_After_Delinking.txt', 'w')
-    coords_after_delinking = io.FileIO(outdir + 'Coords_After_Delinking.txt', 'w')
-    summary_after_delinking = io.FileIO(outdir + prefix+'_Summary.txt', 'w')
-
-    wb_cov_before_delinking = io.BufferedWriter(coverage_before_delinking)
-    wb_coords_before_delinking = io.BufferedWriter(coords_before_delinking) 
-    wb_cov_after_delinking = io.BufferedWriter(coverage_after_delinking)
-    wb_coords_after_delinking = io.BufferedWriter(coords_after_delinking)
-    wb_summary_after_delinking = io.BufferedWriter(summary_after_delinking)
-    
-    cc_before_delinking, cc_after_delinking = 0, 0
-    G_filtered = nx.DiGraph()
+def Convert_GML_Values(tokens):
+    '''
+    Function to convert a column of GML tokens to the python values returned by nx.read_gml
+    Input:
+        tokens: Array of tokens in the GML file
+    Output:
+        values: List of the string, integer or float values of the tokens
+    '''
+    tokens = [t.decode() if isinstance(t, bytes) else t for t in tokens.tolist()]
+    if all(t[0] == '"' for t in tokens):
+        return [html.unescape(t[1:-1]) if '&' in t else t[1:-1] for t in tokens]
+    values = []
+    for t in tokens:
+        if t[0] == '"':
+            values.append(html.unescape(t[1:-1]))
+            continue
+        try:
+            values.append(int(t))
+        except ValueError:
+            values.append(float(t))
+    return values
+
+def File_Cache_Key(path, version):
+    '''
+    Function to compute the key that identifies a version of an input file, from its size, modification 
+    time and a hash of its first and last megabyte. 
+    Input:
+        path: Location of the file
+        version: Version of the format of the cache
+    Output:
+        key: String identifying the file
+    '''
+    st = stat(path)
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        md5.update(f.read(1 << 20))
+        f.seek(max(st.st_size - (1 << 20), 0))
+        md5.update(f.read(1 << 20))
+    return str(version)+'\t'+str(st.st_size)+'\t'+str(st.st_mtime_ns)+'\t'+md5.hexdigest()
+
+###Errors raised by np.load on a cache left partial or empty, the cache is then rebuilt
+Cache_Load_Errors = (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile)
+
+def Replace_File(path, write, mode='wb'):
+    '''
+    Function to write a file atomically. The contents are written to a temporary file next to it that then 
+    replaces it, so a killed run or a concurrent run never leaves a partial file behind. 
+    Input:
+        path: Location of the file
+        write: Function writing the contents to the temporary file opened with mode
+        mode: Mode to open the temporary file with
+    '''
+    tmp_path = path+'.'+str(getpid())+'.tmp'
+    try:
+        with open(tmp_path, mode) as f:
+            write(f)
+        replace(tmp_path, path)
+    finally:
+        if isfile(tmp_path): remove(tmp_path)
+
+def GML_Cache_Key(graph_path):
+    '''
+    Function to compute the key that identifies a version of the oriented.gml file, see File_Cache_Key
+    Input:
+        graph_path: Location of the oriented.gml file
+    Output:
+        key: String identifying the file
+    '''
+    return File_Cache_Key(graph_path, GML_Cache_Version)
+
+def Load_Assembly_Graph(graph_path, cache_path=None):
+    '''
+    Function to load the oriented.gml generated by MetaCarvel. The parsed graph is cached in a binary file 
+    next to the graph, later runs on the same file load the cache instead of parsing the GML. 
+    Input:
+        graph_path: Location of the oriented.gml file
+        cache_path: Location of the cache, defaults to graph_path+'.binnacle.npz'. An empty string disables the cache. 
+    Output:
+        G: Scaffold_Graph with the node orientation and length and the edge orientation and overlap. The tokens 
+           of all the attributes are kept to write the filtered graph. 
+    '''
+    if cache_path is None:
+        cache_path = graph_path + '.binnacle.npz'
+    key = GML_Cache_Key(graph_path)
+    gml = None
+    if len(cache_path) > 0 and isfile(cache_path):
+        try:
+            with np.load(cache_path) as cache:
+                if str(cache['key']) == key:
+                    gml = dict((k, cache[k]) for k in cache.files)
+        except Cache_Load_Errors:
+            print('Could not read the graph cache '+cache_path+', parsing the graph')
+            gml = None
+    if gml is None:
+        gml = Parse_GML_File(graph_path)
+        if len(cache_path) > 0:
+            try:
+                Replace_File(cache_path, lambda f: np.savez(f, key = np.array(key), **gml))
+            except OSError:
+                print('Could not write the graph cache '+cache_path)
+
+    labels = html.unescape(b'\n'.join(gml['labels'].tolist()).decode()).split('\n') if len(gml['labels']) > 0 else []
+    sources, targets = gml['sources'], gml['targets']
+    ###A repeated edge keeps the position of its first occurrence and the attributes of its last one, as in 
+    ###networkx. The edges are then sorted by their source node.
+    pairs = sources*len(labels) + targets
+    unique_pairs, first, inverse = np.unique(pairs, return_index = True, return_inverse = True)
+    last = np.zeros(len(unique_pairs), dtype = np.int64)
+    np.maximum.at(last, inverse.ravel(), np.arange(len(pairs)))
+    first = np.sort(first)
+    first = first[np.argsort(sources[first], kind = 'stable')]
+    last = last[inverse.ravel()[first]]
 
-    for conn in weakly_connected_components:
-        test = nx.DiGraph(graph.subgraph(conn))
-        nodes = list(test.nodes())
+    node_attrs = dict((a, gml['node_'+a]) for a in GML_Node_Attributes)
+    edge_attrs = dict((a, gml['edge_'+a][last]) for a in GML_Edge_Attributes)
+    orientation_codes = dict(zip(Edge_Orientations, range(len(Edge_Orientations))))
+    G = Scaffold_Graph(labels, np.array(Convert_GML_Values(node_attrs['orientation'])) == 'REV',
+                       [int(l) for l in Convert_GML_Values(node_attrs['length'])], sources[first], targets[first], 
+                       [orientation_codes.get(o, -1) for o in Convert_GML_Values(edge_attrs['orientation'])],
+                       np.array(Convert_GML_Values(edge_attrs['mean']), dtype = np.float64).astype(np.int64),
+                       node_attrs = node_attrs, edge_attrs = edge_attrs)
+    return G
 
-        if len(nodes) > 1:
+GML_Escape = re.compile('[^ -~]|[&"]')
+
+def Format_GML_Value(value):
+    '''
+    Function to format an attribute value the way nx.write_gml does
+    Input:
+        value: String, integer or float value
+    Output:
+        text: The value in the GML file
+    '''
+    if isinstance(value, int):
+        ###GML only supports signed 32-bit integers
+        if value < -(2**31) or value >= 2**31:
+            return '"' + str(value) + '"'
+        return str(value)
+    if isinstance(value, float):
+        text = repr(value).upper()
+        if text == repr(float('inf')).upper():
+            return '+' + text
+        epos = text.rfind('E')
+        if epos != -1 and text.find('.', 0, epos) == -1:
+            text = text[:epos] + '.' + text[epos:]
+        return text
+    return '"' + GML_Escape.sub(lambda m: '&#' + str(ord(m.group(0))) + ';', value) + '"'
+
+def Format_GML_Component(graph, nodes, edges, first_id):
+    '''
+    Function to format the node and edge blocks of a component of the filtered assembly graph, in the layout 
+    written by nx.write_gml. 
+    Input:
+        graph: The Scaffold_Graph returned by Load_Assembly_Graph
+        nodes: Sorted array of the nodes of the component
+        edges: Array of the edges of the component
+        first_id: GML id of the first node of the component
+    Output:
+        node_blocks, edge_blocks: The node and edge blocks of the component
+    '''
+    node_attrs = [[Format_GML_Value(v) for v in Convert_GML_Values(graph.node_attrs[a][nodes])] for a in GML_Node_Attributes]
+    node_blocks = ''.join('  node [\n    id '+str(first_id+i)+'\n    label '+Format_GML_Value(graph.labels[n])+'\n'+
+                          ''.join('    '+a+' '+v+'\n' for a, v in zip(GML_Node_Attributes, values))+'  ]\n'
+                          for i, (n, values) in enumerate(zip(nodes.tolist(), zip(*node_attrs))))
+    edge_attrs = [[Format_GML_Value(v) for v in Convert_GML_Values(graph.edge_attrs[a][edges])] for a in GML_Edge_Attributes]
+    source_ids = (first_id + np.searchsorted(nodes, graph.sources[edges])).tolist()
+    target_ids = (first_id + np.searchsorted(nodes, graph.targets[edges])).tolist()
+    edge_blocks = ''.join('  edge [\n    source '+str(u)+'\n    target '+str(v)+'\n'+
+                          ''.join('    '+a+' '+t+'\n' for a, t in zip(GML_Edge_Attributes, values))+'  ]\n'
+                          for u, v, values in zip(source_ids, target_ids, zip(*edge_attrs)))
+    return node_blocks, edge_blocks
+
+def Format_Edge_List(graph, edges):
+    '''
+    Function to format edges of the filtered assembly graph as tab separated rows of the source and target 
+    contigs followed by the orientation, mean, stdev and bsize of the edge. 
+    Input:
+        graph: The Scaffold_Graph returned by Load_Assembly_Graph
+        edges: Array of edges
+    Output:
+        rows: The rows of the edges
+    '''
+    edge_attrs = [Convert_GML_Values(graph.edge_attrs[a][edges]) for a in GML_Edge_Attributes]
+    return ''.join(graph.labels[u]+'\t'+graph.labels[v]+'\t'+'\t'.join(map(str, values))+'\n'
+                   for u, v, values in zip(graph.sources[edges].tolist(), graph.targets[edges].tolist(), zip(*edge_attrs)))
+
+def Prepare_Component(graph, read_coverage, nodes, cycle_breaking, max_cycles, clock):
+    '''
+    Function to break the cycles, assign coordinates and compute the coverage of a single weakly connected 
+    component, the steps of Process_Component that do not depend on the changepoint and delinking parameters. 
+    Input:
+        graph: The Scaffold_Graph returned by Load_Assembly_Graph
+        read_coverage: the coverage intervals returned by Load_Read_Coverage
+        nodes: Sorted array of the nodes in the component
+        cycle_breaking, max_cycles: Method and budget used to break cycles, see Break_Cycles
+        clock: Stopwatch timing the steps
+    Output:
+        test: The component without the edges removed to break cycles
+        result: The result of Process_Component before delinking, complete for a single contig
+    '''
+    test = Component_Subgraph(graph, nodes)
+    removed_edges = []
+
+    if len(nodes) > 1:
+        min_node, min_indegree = Return_Starting_Point(test)
+        if min_indegree > 0: 
+            test, removed_edges = Break_Cycles(test, min_node, cycle_breaking, max_cycles)
             min_node, min_indegree = Return_Starting_Point(test)
+    else: min_node = 0
+    clock.lap('Cycles')
+
+    coords = Compute_Global_Coordinates(test, min_node)
+    clock.lap('Coordinates')
+    coverage_rle = Compute_Coverage_RLE(read_coverage, coords)
+    result = {'coords':coords, 'coverage':coverage_rle, 'summary':Summarize_Coverage_RLE(coverage_rle),
+              'num_nodes':len(nodes), 'num_edges':test.number_of_edges(), 
+              'removed_edges':test.edge_ids[removed_edges], 'delinked':None, 'num_delinked':1, 'times':clock.times}
+    clock.lap('Coverage')
+
+    if len(nodes) == 1:
+        result['nodes'] = test.node_ids
+        result['edges'] = test.edge_ids[test.active_edges()]
+    return test, result
+
+def Delink_Component(test, read_coverage, result, outliers, positions, poscutoff, cycle_breaking, max_cycles, clock, cache=None):
+    '''
+    Function to delink a component at the changepoints of its coverage, the steps of Process_Component that 
+    depend on the changepoint and delinking parameters. 
+    Input:
+        test, result: The component and its result returned by Prepare_Component, result is completed
+        read_coverage: the coverage intervals returned by Load_Read_Coverage
+        outliers: The changepoints of the coverage, see Filter_Neighbors
+        positions: The contigs at every coordinate, see Return_Contig_Scaffold_Positions
+        cycle_breaking, max_cycles: Method and budget used to break cycles, see Break_Cycles
+        clock: Stopwatch timing the steps
+        cache: Dictionary of the delinked components already computed, keyed by their nodes. None to not cache them
+    Output:
+        result: See Process_Component
+    '''
+    coords = result['coords']
+    g_removed = Get_Outlier_Contigs(outliers, positions, coords, test, pos_cutoff=poscutoff)
+    delinked_conn_comps = Weakly_Connected_Components(g_removed)
+    result['num_delinked'] = len(delinked_conn_comps)
+    result['nodes'] = g_removed.node_ids
+    result['edges'] = g_removed.edge_ids[g_removed.active_edges()]
+    clock.lap('Delinking')
+    if len(delinked_conn_comps) == 1:
+        return result
+
+    ###The delinked components are views of the component that keep the edges removed to break its cycles
+    result['delinked'] = []
+    for comp in delinked_conn_comps:
+        if cache is not None and tuple(comp) in cache:
+            result['delinked'].append(cache[tuple(comp)])
+            continue
+        cc = test.view(comp)
+        removed_edges_cc = []
+
+        if len(comp) > 1:
+            min_node, min_indegree = Return_Starting_Point(cc)
             if min_indegree > 0: 
-                print('Requires graph simplification')
-                test = Random_Simplify(test, min_node)
-                min_node, min_indegree = Return_Starting_Point(test)
-        else: min_node = nodes[0]
-
-        cc_before_delinking += 1
-        df_coverage_cc = df_coverage.loc[nodes]
-        coords = Compute_Global_Coordinates(test, min_node)
-        coverage = Compute_Coverage(df_coverage_cc, coords)
+                cc, removed_edges_cc = Break_Cycles(cc, min_node, cycle_breaking, max_cycles)
+                min_node, min_indegree = Return_Starting_Point(cc)
+        else: min_node = int(comp[0])
+
+        coords_cc = Compute_Global_Coordinates(cc, min_node)
+        coverage_cc = Compute_Coverage_RLE(read_coverage, coords_cc)
+        result['delinked'].append({'coords':coords_cc, 'coverage':coverage_cc, 'summary':Summarize_Coverage_RLE(coverage_cc),
+                                   'num_nodes':len(comp), 'num_edges':cc.number_of_edges(), 
+                                   'removed_edges':cc.edge_ids[removed_edges_cc]})
+        if cache is not None:
+            cache[tuple(comp)] = result['delinked'][-1]
+    clock.lap('Delinked')
+    return result
+
+def Process_Component(graph, read_coverage, nodes, window_size=1500, outlier_thresh=99, 
+                      neighbors_outlier_filter=100, poscutoff=100, cycle_breaking='dfs', max_cycles=None):
+    '''
+    Function to assign coordinates, compute coverages and delink a single weakly connected component. 
+    The scaffold ids are not known at this point, they are assigned by Write_Coverage_Outputs when the 
+    results are written in the order of the components. 
+    Input:
+        graph: The Scaffold_Graph returned by Load_Assembly_Graph
+        read_coverage: the coverage intervals returned by Load_Read_Coverage
+        nodes: Sorted array of the nodes in the component
+        cycle_breaking, max_cycles: Method and budget used to break cycles, see Break_Cycles
+    Output:
+        result: A dictionary with the coordinates and coverages before and after delinking, the edges removed 
+                to break cycles and the nodes and edges retained in the filtered graph, as ids in graph, and 
+                the time spent in every step
+    '''
+    clock = Stopwatch(['Cycles', 'Coordinates', 'Coverage', 'Changepoints', 'Delinking', 'Delinked'])
+    test, result = Prepare_Component(graph, read_coverage, nodes, cycle_breaking, max_cycles, clock)
+    if len(nodes) == 1:
+        return result
+
+    coverage = Expand_Coverage_RLE(result['coverage'])
+    clock.lap('Coverage')
+    mean_ratios = Helper_Changepoints_Z_Stat(coverage, window_size = window_size)
+    outliers = ID_outliers(mean_ratios, thresh=outlier_thresh)
+    outliers = Filter_Neighbors(outliers, mean_ratios,window_size=neighbors_outlier_filter)
+    clock.lap('Changepoints')
+    positions = Return_Contig_Scaffold_Positions(result['coords'])
+    return Delink_Component(test, read_coverage, result, outliers, positions, poscutoff, cycle_breaking, max_cycles, clock)
+
+def Process_Component_Sweep(graph, read_coverage, nodes, settings, cycle_breaking='dfs', max_cycles=None):
+    '''
+    Function to process a single weakly connected component with several settings of the changepoint and 
+    delinking parameters. The coordinates and the coverage of the component are computed once, the changepoint 
+    statistic once per window size and the delinked components once per set of changepoints. 
+    Input:
+        graph: The Scaffold_Graph returned by Load_Assembly_Graph
+        read_coverage: the coverage intervals returned by Load_Read_Coverage
+        nodes: Sorted array of the nodes in the component
+        settings: List of the window_size, outlier_thresh, neighbors_outlier_filter and poscutoff of every setting
+        cycle_breaking, max_cycles: Method and budget used to break cycles, see Break_Cycles
+    Output:
+        results: The result of Process_Component with every setting
+    '''
+    clock = Stopwatch(['Cycles', 'Coordinates', 'Coverage', 'Changepoints', 'Delinking', 'Delinked'])
+    test, base = Prepare_Component(graph, read_coverage, nodes, cycle_breaking, max_cycles, clock)
+    if len(nodes) == 1:
+        return [base]*len(settings)
+
+    coverage = Expand_Coverage_RLE(base['coverage'])
+    positions = Return_Contig_Scaffold_Positions(base['coords'])
+    clock.lap('Coverage')
+    ###The statistic of all the window sizes shares the prefix sums of the coverage
+    window_sizes = sorted(set(setting[0] for setting in settings))
+    mean_ratios = dict(zip(window_sizes, Helper_Changepoints_Z_Stat(coverage, window_size = window_sizes)))
+    outliers, delinked, components, results = {}, {}, {}, []
+    for window_size, outlier_thresh, neighbors_outlier_filter, poscutoff in settings:
+        if (window_size, outlier_thresh, neighbors_outlier_filter) not in outliers:
+            cpts = ID_outliers(mean_ratios[window_size], thresh=outlier_thresh)
+            cpts = Filter_Neighbors(cpts, mean_ratios[window_size], window_size=neighbors_outlier_filter)
+            outliers[(window_size, outlier_thresh, neighbors_outlier_filter)] = cpts
+        cpts = outliers[(window_size, outlier_thresh, neighbors_outlier_filter)]
+        clock.lap('Changepoints')
+        ###Settings that find the same changepoints delink the component the same way, and the components 
+        ###delinked by several settings are computed once
+        key = (tuple(int(c) for c in cpts), poscutoff)
+        if key not in delinked:
+            delinked[key] = Delink_Component(test, read_coverage, dict(base), cpts, positions, poscutoff, 
+                                             cycle_breaking, max_cycles, clock, components)
+        results.append(delinked[key])
+    return results
+
+_Component_Worker_State = {}
+
+def Init_Component_Worker(graph, read_coverage, params):
+    '''
+    Function to initialize a worker of the process pool used by Write_Coverage_Outputs and Write_Coverage_Sweep. 
+    Input:
+        graph: The Scaffold_Graph returned by Load_Assembly_Graph
+        read_coverage: the coverage intervals returned by Load_Read_Coverage
+        params: Tuple of the parameters of Process_Component, or of Process_Component_Sweep, after the nodes
+    '''
+    _Component_Worker_State['graph'] = graph
+    _Component_Worker_State['read_coverage'] = read_coverage
+    _Component_Worker_State['params'] = params
+
+def Run_Component_Worker(nodes):
+    '''
+    Function to process a component in a worker of the process pool used by Write_Coverage_Outputs. 
+    Input:
+        nodes: Sorted array of the nodes in the component
+    Output:
+        result: See Process_Component
+    '''
+    return Process_Component(_Component_Worker_State['graph'], _Component_Worker_State['read_coverage'], nodes,
+                             *_Component_Worker_State['params'])
+
+def Run_Component_Sweep_Worker(nodes):
+    '''
+    Function to process a component in a worker of the process pool used by Write_Coverage_Sweep. 
+    Input:
+        nodes: Sorted array of the nodes in the component
+    Output:
+        results: See Process_Component_Sweep
+    '''
+    return Process_Component_Sweep(_Component_Worker_State['graph'], _Component_Worker_State['read_coverage'], nodes,
+                                   *_Component_Worker_State['params'])
+
+Coverage_Journal_Version = 2
+
+def Coverage_Journal_Key(input_paths, params):
+    '''
+    Function to compute the key that identifies the inputs and parameters of a run of Write_Coverage_Outputs, 
+    a journal is only resumed by a run with the same key. The inputs are identified by their path and by 
+    File_Cache_Key, so the graph and the coverages are never hashed. 
+    Input:
+        input_paths: The files the graph and the coverages were read from
+        params: Tuple of the parameters that change the outputs
+    Output:
+        key: String identifying the run
+    '''
+    md5 = hashlib.md5()
+    md5.update(bytes(repr(params), encoding = 'utf-8'))
+    for path in input_paths:
+        md5.update(bytes(abspath(path)+'\t'+File_Cache_Key(path, Coverage_Journal_Version)+'\n', encoding = 'utf-8'))
+    return str(Coverage_Journal_Version)+'\t'+md5.hexdigest()
+
+def Read_Coverage_Journal(journal_path, key, paths):
+    '''
+    Function to read the last component committed to the journal of an interrupted run of Write_Coverage_Outputs. 
+    Input:
+        journal_path: Location of the journal
+        key: Key of the run, see Coverage_Journal_Key
+        paths: The output files of the run, in the order of the offsets of the journal
+    Output:
+        state: Tuple of the number of components before and after delinking and of nodes in the filtered graph
+               written, the size of every output file at the last commit and whether the run completed, None if 
+               the journal does not belong to this run or no component was committed
+    '''
+    if not isfile(journal_path):
+        print('No journal found at '+journal_path)
+        return None
+    with open(journal_path) as f:
+        lines = f.read().split('\n')
+    if len(lines) < 2 or lines[0] != key:
+        print('The journal '+journal_path+' belongs to a run with other inputs or parameters')
+        return None
+    state = None
+    ###The last line is empty when it was written completely, a partial line is ignored
+    for line in lines[1:-1]:
+        tokens = line.split('\t')
+        complete = tokens[0] == 'complete'
+        counters = [int(v) for v in tokens[1:4]]
+        offsets = [int(v) for v in tokens[4:]]
+        state = (counters[0], counters[1], counters[2], offsets, complete)
+    if state is None:
+        print('No component was committed to the journal '+journal_path)
+        return None
+    if len(state[3]) != len(paths) - (1 if state[4] else 0):
+        print('The journal '+journal_path+' lists other output files')
+        return None
+    for path, offset in zip(paths, state[3]):
+        if not isfile(path) or stat(path).st_size < offset:
+            print(path+' is shorter than recorded in the journal '+journal_path)
+            return None
+    return state
+
+def Commit_Coverage_Journal(journal, writers, counters, complete=False):
+    '''
+    Function to flush the outputs of Write_Coverage_Outputs to disk and append their sizes to the journal, a 
+    resumed run continues from the last commit. 
+    Input:
+        journal: The journal opened for appending
+        writers: The buffered output files, in the order of the offsets of the journal
+        counters: The number of components before and after delinking and of nodes in the filtered graph written
+        complete: Mark the run as completed
+    '''
+    offsets = []
+    for wb in writers:
+        wb.flush()
+        fsync(wb.fileno())
+        offsets.append(wb.tell())
+    tokens = ['complete' if complete else 'component'] + [str(c) for c in counters] + [str(o) for o in offsets]
+    journal.write('\t'.join(tokens)+'\n')
+    journal.flush()
+    fsync(journal.fileno())
+
+def Coverage_Output_Paths(outdir, prefix="", edge_list=False, tracks=False):
+    '''
+    Function to list the output files of Write_Coverage_Outputs. 
+    Input:
+        outdir: The directory to write the outputs to
+        prefix, edge_list, tracks: See Write_Coverage_Outputs
+    Output:
+        paths: The output files, the spool of the edges of Assembly_Graph_Filtered.gml is the last
+        track_stores: The track stores written
+    '''
+    ###The edge blocks follow all the node blocks in the GML file, they are spooled to a file and appended 
+    ###once the last component is written
+    paths = [outdir+'Coverages_Before_Delinking.txt', outdir+'Coords_Before_Delinking.txt', outdir+'Coverages_After_Delinking.txt',
+             outdir+'Coords_After_Delinking.txt', outdir+prefix+'_Summary.txt', outdir+'Cycle_Breaking_Edges.txt', 
+             outdir+'Assembly_Graph_Filtered.gml'] + ([outdir+'Assembly_Graph_Filtered.tsv'] if edge_list else [])
+    track_stores = [outdir+'Coverages_Before_Delinking.tracks/', outdir+'Coverages_After_Delinking.tracks/'] if tracks else []
+    for store in track_stores:
+        paths += [store+f for f in Track_Store_Files]
+    paths.append(outdir+'Assembly_Graph_Filtered.gml.edges')
+    return paths, track_stores
+
+class Coverage_Output_Writer:
+    '''
+    Writer of the outputs of Write_Coverage_Outputs, the results of Process_Component are written in the order 
+    of the components and numbered as they are written. 
+    Attributes:
+        paths, writers: The output files and their buffered writers, see Coverage_Output_Paths
+        cc_before_delinking, cc_after_delinking: Number of scaffolds written before and after delinking
+        num_filtered_nodes: Number of nodes written to Assembly_Graph_Filtered.gml
+    '''
+    def __init__(self, graph, outdir, prefix="", integer_depths=False, edge_list=False, tracks=False, state=None):
+        '''
+        Input:
+            graph: The Scaffold_Graph returned by Load_Assembly_Graph
+            outdir, prefix, integer_depths, edge_list, tracks: See Write_Coverage_Outputs
+            state: The commit of a journal to continue the outputs from, see Read_Coverage_Journal. None to 
+                   start them over
+        '''
+        if not isdir(outdir):
+            mkdir(outdir)
+        self.paths, track_stores = Coverage_Output_Paths(outdir, prefix, edge_list, tracks)
+        if state is None:
+            for i, store in enumerate(track_stores):
+                Create_Track_Store(store, delinked = i == 1)
+        self.writers = []
+        for i, path in enumerate(self.paths):
+            if state is None:
+                f = io.FileIO(path, 'w')
+            else:
+                f = io.FileIO(path, 'r+')
+                f.truncate(state[3][i])
+                f.seek(state[3][i])
+            self.writers.append(io.BufferedWriter(f))
+        files = dict(zip(self.paths, self.writers))
+        self.wb_edge_list = files[outdir+'Assembly_Graph_Filtered.tsv'] if edge_list else None
+        self.tracks = [[files[store+f] for f in Track_Store_Files] for store in track_stores]
+        self.graph, self.integer_depths = graph, integer_depths
+
+        self.cc_before_delinking, self.cc_after_delinking = 0, 0
+        self.num_filtered_nodes = 0
+        if state is None:
+            self.writers[6].write(b'graph [\n  directed 1\n')
+        else:
+            self.cc_before_delinking, self.cc_after_delinking, self.num_filtered_nodes = state[:3]
+
+    def counters(self):
+        '''
+        Function to return the counters committed to the journal with the outputs, see Commit_Coverage_Journal.
+        '''
+        return (self.cc_before_delinking, self.cc_after_delinking, self.num_filtered_nodes)
+
+    def write(self, result):
+        '''
+        Function to write the result of a component. 
+        Input:
+            result: See Process_Component
+        '''
+        wb_cov_before_delinking, wb_coords_before_delinking, wb_cov_after_delinking, wb_coords_after_delinking, \
+            wb_summary_after_delinking, wb_cycle_breaking_edges, wb_graph_filtered = self.writers[:7]
+        graph, integer_depths = self.graph, self.integer_depths
+        labels, sources, targets = graph.labels, graph.sources, graph.targets
+
+        self.cc_before_delinking += 1
+        cc_before_delinking, cc_after_delinking = self.cc_before_delinking, self.cc_after_delinking
+        coords, coverage_rle = result['coords'], result['coverage']
+        mu, dev, span = result['summary']
             
         flag = False
-        outmat = Compress_Coverage_Vector(coverage, cc_before_delinking)
+        outmat = Compress_Coverage_RLE(coverage_rle, cc_before_delinking, integer_depths = integer_depths)
         wb_cov_before_delinking.write(bytes(outmat, encoding='utf-8'))
+        if self.tracks:
+            Write_Coverage_Track(self.tracks[0], coverage_rle, cc_before_delinking, cc_before_delinking)
 
         for c in coords:
             d = bytes(str(cc_before_delinking)+'\t'+c+'\t'+ str(coords[c][0]) + '\t' +  str(coords[c][1]) + '\n', encoding = 'utf-8')
             wb_coords_before_delinking.write(d)
+        for e in result['removed_edges'].tolist():
+            wb_cycle_breaking_edges.write(bytes(str(cc_before_delinking)+'\tNA\t'+labels[sources[e]]+'\t'+labels[targets[e]]+'\n', encoding = 'utf-8'))
+        node_blocks, edge_blocks = Format_GML_Component(graph, result['nodes'], result['edges'], self.num_filtered_nodes)
+        wb_graph_filtered.write(bytes(node_blocks, encoding = 'ascii'))
+        self.writers[-1].write(bytes(edge_blocks, encoding = 'ascii'))
+        self.num_filtered_nodes += len(result['nodes'])
+        if self.wb_edge_list is not None:
+            self.wb_edge_list.write(bytes(Format_Edge_List(graph, result['edges']), encoding = 'utf-8'))
 
-        if len(nodes) == 1:
+        if result['num_nodes'] == 1:
             cc_after_delinking += 1
             flag =  True
-            G_filtered.add_nodes_from(test.nodes())
-            for n in test.nodes():
-                G_filtered.nodes[n]['orientation'] = test.nodes[n]['orientation']
-                G_filtered.nodes[n]['length'] = test.nodes[n]['length']
-
-        if len(nodes) > 1:
-            mean_ratios = Helper_Changepoints_Z_Stat(deepcopy(coverage), window_size = window_size)
-            outliers = ID_outliers(mean_ratios, thresh=outlier_thresh)
-            outliers = Filter_Neighbors(outliers, mean_ratios,window_size=neighbors_outlier_filter)
-            Pos_Dict = Return_Contig_Scaffold_Positions(coords)
-            g_removed = Get_Outlier_Contigs(outliers, Pos_Dict, coords, test, pos_cutoff=poscutoff)
-            mu, dev, span = round(np.mean(coverage),1), round(np.std(coverage),1), len(coverage)
-            delinked_conn_comps = list(nx.weakly_connected_components(g_removed))
-            print('Debug---->', cc_before_delinking, len(nodes), len(test.edges()), len(delinked_conn_comps), len(coverage))
-            
-            G_filtered.add_nodes_from(g_removed.nodes())
-            G_filtered.add_edges_from(g_removed.edges())
-            for n in g_removed.nodes():
-                G_filtered.nodes[n]['orientation'] = g_removed.nodes[n]['orientation']
-                G_filtered.nodes[n]['length'] = g_removed.nodes[n]['length']
-            for e in g_removed.edges():
-                G_filtered[e[0]][e[1]]['orientation'] = g_removed[e[0]][e[1]]['orientation']
-                G_filtered[e[0]][e[1]]['mean'] = g_removed[e[0]][e[1]]['mean']
-                G_filtered[e[0]][e[1]]['stdev'] = g_removed[e[0]][e[1]]['stdev']
-                G_filtered[e[0]][e[1]]['bsize'] = g_removed[e[0]][e[1]]['bsize']
-                
-            if len(delinked_conn_comps) == 1:
+        else:
+            if result['delinked'] is None:
                 cc_after_delinking += 1
                 flag = True  
             else:
-                for comp in delinked_conn_comps:
-                    cc = nx.DiGraph(graph.subgraph(comp))
+                for comp in result['delinked']:
                     cc_after_delinking += 1
-                    nodes_cc = list(cc.nodes())
-
-                    if len(nodes_cc) > 1:
-                        min_node, min_indegree = Return_Starting_Point(cc)
-                        if min_indegree > 0: 
-                            cc = Random_Simplify(cc, min_node)
-                            min_node, min_indegree = Return_Starting_Point(cc)
-                    else: min_node = nodes_cc[0]
-
-                    coords_cc = Compute_Global_Coordinates(cc, min_node)
-                    coverage_cc = Compute_Coverage(df_coverage_cc, coords_cc)
-                    mu, dev, span = round(np.mean(coverage_cc),1), round(np.std(coverage_cc),1), len(coverage_cc)
-                    d_after_dlink = bytes(str(cc_after_delinking)+'\t'+str(span)+'\t'+str(mu)+'\t'+str(dev)+'\n', encoding = 'utf-8')
+                    coords_cc, coverage_cc = comp['coords'], comp['coverage']
+                    mu_cc, dev_cc, span_cc = comp['summary']
+                    d_after_dlink = bytes(str(cc_after_delinking)+'\t'+str(span_cc)+'\t'+str(mu_cc)+'\t'+str(dev_cc)+'\n', encoding = 'utf-8')
                     wb_summary_after_delinking.write(d_after_dlink)
-                    print('Debug_after_cc---->', cc_after_delinking, len(nodes_cc), len(cc.edges()),  len(coverage_cc))
-                    outmat = Compress_Coverage_Vector(coverage_cc, cc_before_delinking, cc_after_delinking)
+                    outmat = Compress_Coverage_RLE(coverage_cc, cc_before_delinking, cc_after_delinking, integer_depths)
                     wb_cov_after_delinking.write(bytes(outmat, encoding='utf-8'))      
+                    if self.tracks:
+                        Write_Coverage_Track(self.tracks[1], coverage_cc, cc_after_delinking, cc_before_delinking, split = True)
                     for c in coords_cc:
                         d = bytes(str(cc_after_delinking)+'\t'+str(cc_before_delinking)+'\t'+c+'\t'+str(coords_cc[c][0])+'\t'+str(coords_cc[c][1])+'\n',encoding = 'utf-8')
                         wb_coords_after_delinking.write(d)
+                    for e in comp['removed_edges'].tolist():
+                        wb_cycle_breaking_edges.write(bytes(str(cc_before_delinking)+'\t'+str(cc_after_delinking)+'\t'+labels[sources[e]]+'\t'+labels[targets[e]]+'\n', encoding = 'utf-8'))
 
         if (flag):
-            mu, dev, span = round(np.mean(coverage),1), round(np.std(coverage),1), len(coverage)
-            d_before_dlink = bytes(str(cc_before_delinking) + '\t'+ str(span)+'\t'+ str(mu) +'\t'+ str(dev) + '\n', encoding = 'utf-8')
             d_after_dlink = bytes(str(cc_after_delinking) + '\t'+ str(span)+'\t' +str(mu) +'\t'+ str(dev) + '\n', encoding = 'utf-8')
             wb_summary_after_delinking.write(d_after_dlink)
-            outmat = Compress_Coverage_Vector(coverage, cc_after_delinking, cc_before_delinking)
+            outmat = Compress_Coverage_RLE(coverage_rle, cc_after_delinking, cc_before_delinking, integer_depths)
             wb_cov_after_delinking.write(bytes(outmat, encoding = 'utf-8'))
+            if self.tracks:
+                Write_Coverage_Track(self.tracks[1], coverage_rle, cc_after_delinking, cc_before_delinking)
                     
             for c in coords:
                 d = bytes(str(cc_after_delinking) + '\t' + str(cc_before_delinking) + '\t' +c+'\t'+str(coords[c][0]) + '\t' + str(coords[c][1]) + '\n', encoding = 'utf-8')
                 wb_coords_after_delinking.write(d)
+        self.cc_after_delinking = cc_after_delinking
+
+    def close(self, journal=None):
+        '''
+        Function to append the spooled edges to Assembly_Graph_Filtered.gml and close the outputs. 
+        Input:
+            journal: The journal of the run, the completed run is committed to it. None when no journal is kept
+        '''
+        self.writers[-1].close()
+        with open(self.paths[-1], 'rb') as f:
+            shutil.copyfileobj(f, self.writers[6])
+        self.writers[6].write(b']\n')
+        if journal is not None:
+            Commit_Coverage_Journal(journal, self.writers[:-1], self.counters(), complete = True)
+        for wb in self.writers[:-1]:
+            wb.close()
+        remove(self.paths[-1])
+
+def Write_Coverage_Outputs(graph,read_coverage, outdir, window_size=1500, outlier_thresh=99, 
+                           neighbors_outlier_filter=100, poscutoff=100,prefix = "", threads=1, integer_depths=False,
+                           cycle_breaking='dfs', max_cycles=None, edge_list=False, metrics=None, journal_path=None, 
+                           resume=False, checkpoint_interval=10, tracks=False, input_paths=()):
+    '''
+    Wrapper function to compute coverages and write outputs to. 
+    Input:
+        graph: The Scaffold_Graph returned by Load_Assembly_Graph
+        read_coverage: the coverage intervals returned by Load_Read_Coverage
+        outdir: The directory to write the outputs to 
+        threads: Number of processes to distribute the connected components over. The outputs 
+                 are identical to running with a single process. 
+        integer_depths: Write the depths in the coverage files as integers instead of floats
+        cycle_breaking, max_cycles: Method and budget used to break cycles, see Break_Cycles. The edges 
+                                    removed are written to Cycle_Breaking_Edges.txt
+        edge_list: Also write the edges of the filtered assembly graph to Assembly_Graph_Filtered.tsv, see 
+                   Format_Edge_List
+        metrics: Metrics object recording the metrics of every component and their totals in the stage 
+                 Components, None to not record them
+        journal_path: Location of a journal of the components written, committed to disk every checkpoint_interval 
+                      seconds along with the outputs. None to not keep a journal
+        resume: Continue the run recorded in the journal from its last committed component, the outputs are 
+                truncated to their size at that commit. The run starts over when the journal is missing or was 
+                written with other inputs or parameters. 
+        tracks: Also write the coverages to the track stores Coverages_Before_Delinking.tracks and 
+                Coverages_After_Delinking.tracks, see Coverage_Track_Store
+        input_paths: The files the graph and the coverages were read from, the journal is keyed on them and 
+                     on the parameters, see Coverage_Journal_Key
+    '''
+
+    if not isdir(outdir):
+        mkdir(outdir)
+
+    params = (window_size, outlier_thresh, neighbors_outlier_filter, poscutoff, cycle_breaking, max_cycles)
+    paths, track_stores = Coverage_Output_Paths(outdir, prefix, edge_list, tracks)
+    state, journal = None, None
+    if journal_path is not None:
+        key = Coverage_Journal_Key(input_paths, params + (integer_depths, edge_list, prefix, tracks))
+        if resume:
+            state = Read_Coverage_Journal(journal_path, key, paths)
+            if metrics is not None:
+                metrics.resume_components(state[0] if state is not None else 0)
+        if state is not None and state[4]:
+            for path, offset in zip(paths, state[3]):
+                with open(path, 'r+b') as f:
+                    f.truncate(offset)
+            if isfile(paths[-1]): remove(paths[-1])
+            print('All the components were written by the previous run')
+            return
+        ###The journal is rewritten with the commit the run resumes from, dropping a partially written line
+        journal = open(journal_path, 'w')
+        journal.write(key+'\n')
+        if state is not None:
+            journal.write('\t'.join(['component'] + [str(v) for v in state[:3]] + [str(o) for o in state[3]])+'\n')
+            print('Resuming after component '+str(state[0]))
+        journal.flush()
+        
+    weakly_connected_components = Weakly_Connected_Components(graph)
+    if state is not None:
+        weakly_connected_components = weakly_connected_components[state[0]:]
+    pool = None
+    if threads > 1:
+        ###Forked workers share the graph and coverages with the parent instead of unpickling them, and do 
+        ###not re-run the top level code of the calling script. 
+        pool = mp.get_context('fork').Pool(threads, initializer = Init_Component_Worker, initargs = (graph, read_coverage, params))
+        results = pool.imap(Run_Component_Worker, weakly_connected_components)
+    else:
+        results = (Process_Component(graph, read_coverage, conn, *params) for conn in weakly_connected_components)
+    
+    writer = Coverage_Output_Writer(graph, outdir, prefix, integer_depths, edge_list, tracks, state)
+    last_commit = time.perf_counter()
+
+    for result in results:
+        writer.write(result)
+
+        if metrics is not None:
+            cycle_edges = len(result['removed_edges'])
+            if result['delinked'] is not None:
+                cycle_edges += sum(len(comp['removed_edges']) for comp in result['delinked'])
+            times = result['times']
+            mu, dev, span = result['summary']
+            metrics.component([writer.cc_before_delinking, result['num_nodes'], result['num_edges'], cycle_edges, 
+                               result['num_delinked'], span, mu] + ['%.6f' % times[t] for t in times])
+            metrics.add('Components', 'Components', 1)
+            metrics.add('Components', 'Delinked_Components', result['num_delinked'])
+            metrics.add('Components', 'Cycle_Edges', cycle_edges)
+            for t in times: metrics.add('Components', t+'_s', times[t])
+
+        if journal is not None and time.perf_counter() - last_commit >= checkpoint_interval:
+            Commit_Coverage_Journal(journal, writer.writers, writer.counters())
+            last_commit = time.perf_counter()
 
-    del df_coverage
-    wb_cov_before_delinking.flush()
-    wb_coords_before_delinking.flush()
-    wb_cov_after_delinking.flush()
-    wb_coords_after_delinking.flush()
-    wb_summary_after_delinking.flush()
-    nx.write_gml(G_filtered, outdir+'Assembly_Graph_Filtered.gml')
+    if pool is not None:
+        pool.close()
+        pool.join()
+    del read_coverage
+    writer.close(journal)
+    if journal is not None:
+        journal.close()
     
     print('Done.....')
 
+def Sweep_Setting_Name(setting):
+    '''
+    Function to name the output directory of a setting of Write_Coverage_Sweep, such as w1500_t99_n100_p100. 
+    Input:
+        setting: Tuple of window_size, outlier_thresh, neighbors_outlier_filter and poscutoff
+    '''
+    window_size, outlier_thresh, neighbors_outlier_filter, poscutoff = setting
+    return 'w'+str(window_size)+'_t'+('%g' % outlier_thresh)+'_n'+str(neighbors_outlier_filter)+'_p'+str(poscutoff)
+
+def Compute_N50(spans):
+    '''
+    Function to compute the N50 of the spans of the scaffolds, the span of the scaffold covering half of the 
+    total span when the scaffolds are sorted from the longest. 
+    '''
+    spans = np.sort(np.asarray(spans, dtype = np.int64))[::-1]
+    if len(spans) == 0:
+        return 0
+    return int(spans[np.searchsorted(np.cumsum(spans), spans.sum()/2.0)])
+
+def Write_Coverage_Sweep(graph, read_coverage, outdir, settings, prefix="", threads=1, integer_depths=False,
+                         cycle_breaking='dfs', max_cycles=None, edge_list=False, tracks=False):
+    '''
+    Wrapper function to write the outputs of Write_Coverage_Outputs for several settings of the changepoint and 
+    delinking parameters in a single pass over the components, see Process_Component_Sweep. The outputs of every 
+    setting are written to a directory of outdir named by Sweep_Setting_Name and are identical to running 
+    Write_Coverage_Outputs with the setting. Sweep_Summary.txt in outdir compares the scaffolds of the settings. 
+    Input:
+        graph: The Scaffold_Graph returned by Load_Assembly_Graph
+        read_coverage: the coverage intervals returned by Load_Read_Coverage
+        outdir: The directory to write the outputs to 
+        settings: List of the window_size, outlier_thresh, neighbors_outlier_filter and poscutoff of every setting
+        prefix, threads, integer_depths, cycle_breaking, max_cycles, edge_list, tracks: See Write_Coverage_Outputs
+    Output:
+        setting_dirs: The output directory of every setting
+    '''
+    if not isdir(outdir):
+        mkdir(outdir)
+
+    params = (settings, cycle_breaking, max_cycles)
+    weakly_connected_components = Weakly_Connected_Components(graph)
+    pool = None
+    if threads > 1:
+        pool = mp.get_context('fork').Pool(threads, initializer = Init_Component_Worker, initargs = (graph, read_coverage, params))
+        results = pool.imap(Run_Component_Sweep_Worker, weakly_connected_components)
+    else:
+        results = (Process_Component_Sweep(graph, read_coverage, conn, *params) for conn in weakly_connected_components)
+
+    setting_dirs = [outdir+Sweep_Setting_Name(setting)+'/' for setting in settings]
+    writers = [Coverage_Output_Writer(graph, d, prefix, integer_depths, edge_list, tracks) for d in setting_dirs]
+    ###Scaffolds split by delinking, edges removed by delinking and spans after delinking of every setting
+    num_split, num_delinked_edges = [0]*len(settings), [0]*len(settings)
+    spans = [[] for setting in settings]
+
+    for sweep_results in results:
+        for i, result in enumerate(sweep_results):
+            writers[i].write(result)
+            if result['delinked'] is None:
+                spans[i].append(result['summary'][2])
+            else:
+                num_split[i] += 1
+                spans[i] += [comp['summary'][2] for comp in result['delinked']]
+            num_delinked_edges[i] += result['num_edges'] - len(result['edges'])
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    del read_coverage
+    for writer in writers:
+        writer.close()
+
+    with open(outdir+'Sweep_Summary.txt', 'w') as f:
+        f.write('Setting\tWindow_Size\tThreshold\tNeighbor_Cutoff\tPoscutoff\tScaffolds_Before_Delinking\tScaffolds_After_Delinking\t'
+                'Delinked_Scaffolds\tDelinked_Edges\tN50\tMax_Span\n')
+        for i, setting in enumerate(settings):
+            row = [Sweep_Setting_Name(setting)] + list(setting) + [writers[i].cc_before_delinking, writers[i].cc_after_delinking, 
+                   num_split[i], num_delinked_edges[i], Compute_N50(spans[i]), max(spans[i], default = 0)]
+            f.write('\t'.join(map(str, row))+'\n')
+
+    print('Done.....')
+    return setting_dirs
+
 def Append_Removed_Contigs(opdir, df_not_found, prefix):
     '''
     Function to append the contigs not considered for scaffolding by metacarvel.
@@ -261,19 +1015,83 @@ def Append_Removed_Contigs(opdir, df_not_found, prefix):
     df_summary.to_csv(opdir+prefix+'_Summary.txt', sep = '\t', header = False)
     
     
-def Load_FASTA_File(input_file):
+def Build_FASTA_Index(fasta_path):
     '''
-    Function to load the fasta file of the contigs
+    Function to index the sequences of a fasta file the way samtools faidx does, without loading the 
+    sequences. The file is memory mapped and scanned for the headers. 
     Input:
-        input_file: Location of the contigs.fasta file
+        fasta_path: Location of the fasta file
     Output:
-        d: Dictionary whose the keys are the contigs and the values are sequences
+        index: Dictionary whose keys are the names of the sequences and the values are their length, the byte 
+               offset of their first base, and the number of bases and bytes in each line
     '''
-    d = {}
-    fasta_sequences = SeqIO.parse(open(input_file),'fasta')
-    for f in fasta_sequences:
-        d[f.name] = str(f.seq)
-    return d
+    index = {}
+    if stat(fasta_path).st_size == 0:
+        return index
+    with open(fasta_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        header = mm.find(b'>')
+        while header >= 0:
+            eol = mm.find(b'\n', header)
+            if eol < 0: eol = size
+            name = mm[header+1:eol].split()
+            offset = min(eol+1, size)
+            next_header = mm.find(b'\n>', eol)
+            end = size if next_header < 0 else next_header+1
+            block = mm[offset:end]
+            length = len(block) - block.count(b'\n') - block.count(b'\r')
+            line_end = block.find(b'\n')
+            line_width = len(block) if line_end < 0 else line_end+1
+            line_bases = len(block[:line_width].rstrip(b'\r\n'))
+            if len(name) > 0:
+                index[name[0].decode()] = (length, offset, line_bases, line_width)
+            header = -1 if next_header < 0 else next_header+1
+    return index
+
+def Load_FASTA_Index(fasta_path, rebuild=False):
+    '''
+    Function to load the index of a fasta file from fasta_path+'.fai'. The index is built and written there 
+    if it is missing, older than the fasta file or can not be parsed. 
+    Input:
+        fasta_path: Location of the fasta file
+        rebuild: Build the index even if it is up to date, for instance when it lacks a sequence
+    Output:
+        index: The index of the sequences, see Build_FASTA_Index
+    '''
+    fai_path = fasta_path + '.fai'
+    if not rebuild and isfile(fai_path) and stat(fai_path).st_mtime_ns >= stat(fasta_path).st_mtime_ns:
+        index = {}
+        try:
+            with open(fai_path) as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    index[fields[0]] = tuple(int(fields[i]) for i in range(1, 5))
+            return index
+        except (ValueError, IndexError):
+            print('Could not read the fasta index '+fai_path+', indexing '+fasta_path)
+    index = Build_FASTA_Index(fasta_path)
+    try:
+        Replace_File(fai_path, lambda f: f.writelines(name+'\t'+'\t'.join(str(v) for v in entry)+'\n' 
+                                                      for name, entry in index.items()), 'w')
+    except OSError:
+        print('Could not write the fasta index '+fai_path)
+    return index
+
+def Write_FASTA_Sequence(wb, mm, entry):
+    '''
+    Function to copy a sequence from a memory mapped fasta file to a buffer, without the line breaks. 
+    Input:
+        wb: Buffer to write the sequence to
+        mm: The memory mapped fasta file
+        entry: Entry of the sequence in the index of the fasta file
+    '''
+    length, offset, line_bases, line_width = entry
+    if line_bases >= length:
+        wb.write(memoryview(mm)[offset:offset+length])
+        return
+    end = mm.find(b'>', offset)
+    if end < 0: end = len(mm)
+    wb.write(mm[offset:end].translate(None, b'\r\n'))
 
 def Get_Contigs_in_Scaffolds(input_file):
     '''
@@ -284,34 +1102,45 @@ def Get_Contigs_in_Scaffolds(input_file):
         df_coords_dictionary: A dictionary whose keys are scaffold id and the values are a list of contigs in the scaffold. 
     '''
     df_coords = pd.read_csv(input_file, names = ['CC_after_dlnk', 'CC_before_dlnk', 
-                                                  'Contig', 'Start', 'End', 'Ingraph', 'Length'], sep = '\t')
+                                                  'Contig', 'Start', 'End', 'Ingraph', 'Length'], sep = '\t', 
+                            dtype = {'Contig': str})
     df_coords = df_coords[['CC_after_dlnk','Contig']]
     df_coords = df_coords.groupby('CC_after_dlnk')['Contig'].apply(list)
     return (df_coords.to_dict())
 
 def Write_Scaffolds(Contigs_Path, Coords_Path, op_path):
     '''
-    Function to write a fasta file of the scaffolds. 
+    Function to write a fasta file of the scaffolds. The contigs are copied from the memory mapped contigs 
+    file through its index, the sequences are never loaded in memory. 
     Input:
         Contigs_Path: Location of the contigs.fasta file
         Coords_Path: Location of the coordinates file generated by binnacle
         op_path: The location to write the scaffold.fasta file. 
     '''
     try:
-        contigs = Load_FASTA_File(Contigs_Path)
+        index = Load_FASTA_Index(Contigs_Path)
         Scaffolds = Get_Contigs_in_Scaffolds(Coords_Path)
-        connected_component_keys = list(Scaffolds.keys())
-        f_op = io.FileIO(op_path, 'w')
-        wb = io.BufferedWriter(f_op)
-
-        for c in connected_component_keys:
-            fasta_seq = '>'+str(c)+'\n'
-            contigs_in_scaffold = list(Scaffolds[c])
-            add_buff = 'N'*100
-            for contig in contigs_in_scaffold[:-1]:
-                fasta_seq += contigs[contig] + add_buff
-            fasta_seq += contigs[contigs_in_scaffold[-1]]+'\n'
-            wb.write(bytes(fasta_seq, encoding = 'utf-8'))
-        wb.flush()
+        ###An index left incomplete by an interrupted run is rebuilt
+        missing = [contig for contigs in Scaffolds.values() for contig in contigs if contig not in index]
+        if len(missing) > 0:
+            index = Load_FASTA_Index(Contigs_Path, rebuild = True)
+            missing = [contig for contig in missing if contig not in index]
+        if len(missing) > 0:
+            print('The contigs '+', '.join(missing[:5])+(' ...' if len(missing) > 5 else '')+' are not in '+Contigs_Path)
+            sys.exit(1)
+        add_buff = b'N'*100
+        with open(Contigs_Path, 'rb') as f, open(op_path, 'wb') as wb:
+            mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) if stat(Contigs_Path).st_size > 0 else b''
+            try:
+                for c in Scaffolds.keys():
+                    wb.write(bytes('>'+str(c)+'\n', encoding = 'utf-8'))
+                    contigs_in_scaffold = list(Scaffolds[c])
+                    for contig in contigs_in_scaffold[:-1]:
+                        Write_FASTA_Sequence(wb, mm, index[contig])
+                        wb.write(add_buff)
+                    Write_FASTA_Sequence(wb, mm, index[contigs_in_scaffold[-1]])
+                    wb.write(b'\n')
+            finally:
+                if len(mm) > 0: mm.close()
     except FileNotFoundError:
         print('Check Filepaths. File not Found')
\ No newline at end of file
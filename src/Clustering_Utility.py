@@ -8,102 +8,260 @@ Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
 
 from Binnacle_IO_Utility import *
 
-def Estimate_Scaffold_Coverage_Coords(df_coverages, df_coords, df_not_found):
+Layout_Cache_Version = 1
+
+def Build_Scaffold_Layout(df_coords):
+    '''
+    Function to build the layout of the scaffolds from the coordinates file, once for all the samples whose 
+    coverages are estimated on the scaffolds. 
+    Input:
+        df_coords: Coordinates for the contigs along the scaffolds along the global coorinates. 
+    Output:
+        layout: Dictionary with the sorted scaffold ids with their span and length, and for every contig its id, 
+                the position of its scaffold in the scaffold ids, its offset along the scaffold, its length and 
+                its strand
+    '''
+    scaffolds, codes = np.unique(df_coords['cc_aft_dlink'].values, return_inverse = True)
+    codes = codes.ravel()
+    start = df_coords['Start'].values.astype(np.int64)
+    end = df_coords['End'].values.astype(np.int64)
+    span = np.full(len(scaffolds), np.iinfo(np.int64).min)
+    np.maximum.at(span, codes, np.maximum(start, end))
+    forward = start <= end
+    layout = {'scaffolds':scaffolds, 'span':span + 1, 
+              'length':np.bincount(codes, weights = np.abs(start - end), minlength = len(scaffolds)).astype(np.int64),
+              'contigs':df_coords['Contig'].tolist(), 'scaffold':codes, 
+              'offset':np.where(forward, start, end + 1), 'contig_length':np.abs(start - end), 'forward':forward}
+    return layout
+
+def Load_Scaffold_Layout(coords_path, cache_path=None):
+    '''
+    Function to load the layout of the scaffolds in the coordinates file written by binnacle. The layout is 
+    cached in a binary file next to the coordinates, later runs on the same file, for instance to estimate 
+    the abundances of the scaffolds in other samples, load the cache instead of parsing the coordinates. 
+    Input:
+        coords_path: Location of the Coords_After_Delinking.txt file
+        cache_path: Location of the cache, defaults to coords_path+'.layout.npz'. An empty string disables the cache. 
+    Output:
+        layout: Layout of the scaffolds, see Build_Scaffold_Layout
+    '''
+    if cache_path is None:
+        cache_path = coords_path + '.layout.npz'
+    key = File_Cache_Key(coords_path, Layout_Cache_Version)
+    if len(cache_path) > 0 and isfile(cache_path):
+        try:
+            with np.load(cache_path) as cache:
+                if str(cache['key']) == key:
+                    layout = dict((k, cache[k]) for k in cache.files if k != 'key')
+                    contigs = layout['contigs'].tolist()
+                    layout['contigs'] = b'\n'.join(contigs).decode().split('\n') if len(contigs) > 0 else []
+                    return layout
+        except Cache_Load_Errors:
+            print('Could not read the layout cache '+cache_path+', parsing the coordinates')
+
+    df_coords = pd.read_csv(coords_path, names = ['cc_aft_dlink', 'cc_bef_dlink', 'Contig', 'Start', 'End', 'Ingraph', 'Length'], 
+                            sep = '\t')
+    df_coords['Contig'] = df_coords['Contig'].astype(str)
+    layout = Build_Scaffold_Layout(df_coords[df_coords['Ingraph'] == 1])
+    if len(cache_path) > 0:
+        cache = dict(layout)
+        cache['contigs'] = np.array([c.encode() for c in layout['contigs']], dtype = bytes)
+        try:
+            Replace_File(cache_path, lambda f: np.savez(f, key = np.array(key), **cache))
+        except OSError:
+            print('Could not write the layout cache '+cache_path)
+    return layout
+
+def Summarize_Scaffold_Coverages(read_coverage, layout):
+    '''
+    Function to estimate the mean and deviation of the coverage of all the scaffolds of a layout at once. The 
+    scaffolds are laid end to end and the -bga intervals of their contigs are merged with a single sweep line, 
+    the runs of each scaffold are the ones Compute_Coverage_RLE returns for it. 
+    Input:
+        read_coverage: Coverage intervals of the contigs returned by Load_Read_Coverage
+        layout: Layout of the scaffolds returned by Build_Scaffold_Layout
+    Output:
+        mu: Mean coverage of the scaffolds
+        sigma: Standard deviation of the coverage of the scaffolds
+    '''
+    span = layout['span']
+    if len(span) == 0:
+        return np.zeros(0), np.zeros(0)
+    base = np.concatenate(([0], np.cumsum(span)))
+    offset = base[layout['scaffold']] + layout['offset']
+    lengths, forward = layout['contig_length'], layout['forward']
+
+    idx, starts, ends, depths = Get_Contig_Coverages(read_coverage, layout['contigs'])
+    lo = np.clip(starts.astype(np.int64), 0, lengths[idx])
+    hi = np.clip(ends.astype(np.int64), 0, lengths[idx])
+    depth = depths.astype(np.float64)
+    run_start = offset[idx] + np.where(forward[idx], lo, lengths[idx] - hi)
+    run_end = offset[idx] + np.where(forward[idx], hi, lengths[idx] - lo)
+    nonempty = hi > lo
+
+    pos = np.concatenate((base, run_start[nonempty], run_end[nonempty]))
+    delta = np.concatenate((np.zeros(len(base)), depth[nonempty], -depth[nonempty]))
+    bounds, inverse = np.unique(pos, return_inverse = True)
+    level = np.cumsum(np.bincount(inverse.ravel(), weights = delta))[:-1] + 0.0
+    run_scaffold = np.searchsorted(base, bounds[:-1], side = 'right') - 1
+    run_ids = np.concatenate(([0], np.flatnonzero((np.diff(level) != 0) | (np.diff(run_scaffold) != 0)) + 1))
+    run_lengths = np.diff(np.append(bounds[run_ids], base[-1]))
+    level, run_scaffold = level[run_ids], run_scaffold[run_ids]
+
+    ###Segmented sums over the runs of each scaffold add up the same terms as Summarize_Coverage_RLE
+    first_run = np.searchsorted(run_scaffold, np.arange(len(span)))
+    mean = np.add.reduceat(run_lengths*level, first_run)/span
+    var = np.add.reduceat(run_lengths*(level-mean[run_scaffold])**2, first_run)/span
+    return np.round(mean, 1), np.round(np.sqrt(var), 1)
+
+def Estimate_Scaffold_Coverage_Coords(read_coverage, df_coords, df_not_found, layout=None):
     '''
     Function to generate the features for all vs all alignments. 
     Input:
-        df_coverages: Coverage of the contigs obtained by mapping contigs to reads.
+        read_coverage: Coverage of the contigs obtained by mapping contigs to reads, as returned by Load_Read_Coverage.
         df_coords: Coordinates for the contigs along the scaffolds along the global coorinates. 
+        df_not_found: Summary of the coverages of the contigs not in the scaffolds
+        layout: Layout of the scaffolds returned by Load_Scaffold_Layout, built from df_coords if not given
     Output:
         df_summary: Dataframe object with the mean and deviation for the scaffold. 
     '''
-    scaffolds = df_coords['cc_aft_dlink'].tolist()
-    df_coords = df_coords.set_index('cc_aft_dlink')
-    counter = pd.DataFrame(data = {'Scaffold':scaffolds})
-    counter['Counter'] = 1
-    counter = counter.groupby('Scaffold').sum()
-    counter = dict(zip(list(counter.index), list(counter['Counter'])))
-    df_coords['Coords'] = list(zip(df_coords['Start'].tolist(), df_coords['End'].tolist()))
-    mu_list, sigma_list, spanlist, lengthlist = [], [], [], []
-
-    print(df_coverages.head())
-    contigs_in_coverages = list(df_coverages.index.unique())
-    #print(contigs_in_coverages)
-    for scaffold in np.unique(scaffolds):
-        df_coords_filtered = df_coords.loc[scaffold]
-        if counter[scaffold] > 1:
-            coords = dict(zip(df_coords_filtered['Contig'].tolist(), df_coords_filtered['Coords'].tolist()))
-        else: 
-            coords = {df_coords_filtered['Contig']:df_coords_filtered['Coords']}
-
-        contigs = list(coords.keys())
-        try:
-            df_coverages_scaffold = df_coverages.loc[contigs]
-        except KeyError:
-            print('Key Error. Filtering....')
-            contigs_not_in_coverages = list(set(contigs) - set(contigs_in_coverages))
-            contigs_in_scaffold = list(set(contigs) - set(contigs_not_in_coverages))
-            df_coverages_scaffold = df_coverages.loc[contigs_in_scaffold]
-            for c in contigs_not_in_coverages:
-                length = max(coords[c])-min(coords[c])
-                df_coverages_scaffold.loc[c] = [0,length,0]
-
-        coverages = Compute_Coverage(df_coverages_scaffold, coords)
-        mean, std = round(np.mean(coverages),1), round(np.std(coverages), 1)
-        length = np.sum(np.abs(df_coords_filtered['Start'] - df_coords_filtered['End']))
-
-        mu_list.append(mean)
-        sigma_list.append(std)
-        spanlist.append(len(coverages))
-        lengthlist.append(length)
-
-    df_summary = pd.DataFrame(data = {'Scaffold_id':np.unique(scaffolds), 'Length':lengthlist, 
-                                      'Span':spanlist, 'Mu':mu_list, 'Sigma':sigma_list})
+    if layout is None:
+        layout = Build_Scaffold_Layout(df_coords)
+    mu, sigma = Summarize_Scaffold_Coverages(read_coverage, layout)
+
+    df_summary = pd.DataFrame(data = {'Scaffold_id':layout['scaffolds'], 'Length':layout['length'], 
+                                      'Span':layout['span'], 'Mu':mu, 'Sigma':sigma})
+    df_not_found = df_not_found.copy()
     df_not_found['Scaffold_id'] = list(range(1, len(df_not_found)+1))
-    df_not_found['Scaffold_id'] += len(mu_list)
+    df_not_found['Scaffold_id'] += len(mu)
     df_not_found = df_not_found.rename(columns = {'Mean':'Mu', 'Std':'Sigma'})
     df_not_found['Span'] = df_not_found['Length']
     df_summary = pd.concat([df_summary, df_not_found[['Scaffold_id','Length','Span','Mu', 'Sigma']]])
     df_summary = df_summary.set_index('Scaffold_id')
-    print(df_summary.head())
     return df_summary
 
-def Format_Outputs(summary_dir, binning_method):
+def Estimate_Scaffold_Coverage_Samples(samples, layout, output_dir):
+    '''
+    Function to estimate the coverage of the scaffolds in several samples. The coverages of the samples are 
+    loaded one at a time and projected on the layout of the scaffolds. The summary of every sample is written to 
+    output_dir as if Estimate_Abundances.py was run on it. 
+    Input:
+        samples: List of the prefix, coverage file and coverage command of each sample, see Load_Sample_Coverage
+        layout: Layout of the scaffolds returned by Load_Scaffold_Layout
+        output_dir: The directory to write the summaries to
+    Output:
+        summaries: List of the prefix and summary of each sample
+    '''
+    summaries = []
+    for prefix, coverage_path, coverage_cmd in samples:
+        if len(coverage_cmd) == 0:
+            print('Estimating the abundances from '+coverage_path)
+        read_coverage, df_not_found_summary = Load_Sample_Coverage(coverage_path, coverage_cmd, layout['contigs'])
+        df_summary = Estimate_Scaffold_Coverage_Coords(read_coverage, None, df_not_found_summary, layout)
+        df_summary.to_csv(output_dir + prefix+'_Summary.txt', sep = '\t', header = False)
+        summaries.append((prefix, df_summary))
+    return summaries
+
+Summary_Columns = ['Scaffold', 'Length', 'Span', 'Mu', 'Sigma']
+
+def Read_Summary_File(summary_path):
+    '''
+    Function to read a summary file written by Estimate_Abundances.py. 
+    Input:
+        summary_path: Location of the summary file
+    Output:
+        The scaffold ids and the Span, Mu and Sigma columns as arrays
+    '''
+    df = pd.read_csv(summary_path, names = Summary_Columns, usecols = [0, 2, 3, 4], sep = '\t', engine = 'c')
+    return df['Scaffold'].values, df['Span'].values, df['Mu'].values, df['Sigma'].values
+
+def Build_Feature_Matrix(scaffolds, prefixes, summaries, binning_method):
+    '''
+    Function to build the feature matrix of the binning method specified. The matrix of all the samples is 
+    allocated once and the columns of every sample are filled in as its summary is read. 
+    Input:
+        scaffolds: Sorted index of the scaffolds in any of the summaries
+        prefixes: Column prefix of each sample
+        summaries: Iterable over the scaffold ids, Span, Mu and Sigma arrays of each sample, in the order 
+                   of the prefixes
+        binnning_method: Choice of binning method (metabat, concoct, maxbin)
+    Output:
+        df_summary: The feature matrix
+    '''
+    matrix = np.full((len(scaffolds), 2*len(prefixes)), np.nan, order = 'F')
+    span = np.full(len(scaffolds), np.nan)
+    for i, (ids, s, mu, sigma) in enumerate(summaries):
+        rows = scaffolds.get_indexer(ids)
+        matrix[rows, 2*i] = mu
+        matrix[rows, 2*i+1] = sigma*sigma
+        if i == 0:
+            ###Only the spans of the first sample are reported
+            span[rows] = s
+            if len(rows) == len(scaffolds): span = span.astype(s.dtype)
+
+    columns = []
+    for p in prefixes: columns += [p+'_Mu', p+'_Var']
+    method = binning_method.lower()
+    if method.startswith('maxbin') or method.startswith('concoct'):
+        df_summary = pd.DataFrame(matrix[:, 0::2], index = scaffolds, columns = columns[0::2])
+    else:
+        df_summary = pd.DataFrame(matrix, index = scaffolds, columns = columns)
+    if method.startswith('metabat'):
+        df_summary.insert(0, 'Avg_Depth', df_summary.filter(regex='_Mu').mean(axis=1))
+        df_summary.insert(0, 'Span', span)
+    df_summary.index.name = 'Scaffold'
+    return df_summary
+
+def Join_Summaries(summaries, binning_method):
+    '''
+    Function to join the summaries of several samples into the feature matrix of the binning method specified. 
+    Input:
+        summaries: List of the column prefix and summary of each sample, indexed by scaffold with the Length, 
+                   Span, Mu and Sigma columns
+        binnning_method: Choice of binning method (metabat, concoct, maxbin)
+    Output:
+        df_summary: The feature matrix
+    '''
+    prefixes = [col_prefix for col_prefix, df in summaries]
+    scaffolds = pd.Index(np.concatenate([df.index.values for col_prefix, df in summaries])).unique().sort_values()
+    return Build_Feature_Matrix(scaffolds, prefixes, ((df.index.values, df['Span'].values, df['Mu'].values, df['Sigma'].values)
+                                                      for col_prefix, df in summaries), binning_method)
+
+def Format_Outputs(summary_dir, binning_method, threads=1):
     '''
-    Function to format outputs to the binning method specified. 
+    Function to format outputs to the binning method specified. The summary files are read in parallel, 
+    then copied into the feature matrix once the scaffolds of all the samples are known. 
     Input:
+        summary_dir: The directory containing the summary files generated by Estimate_Abundances.py
         binnning_method: Choice of binning method (metabat, concoct, maxbin)
-        coords_path: Coordinate file for the scaffolds
-        summary_path: The path to the txt file containing the summary information by running binnacle on the original sample.
-        align_flag: A flag that specifes whether to peform all vs all alignments
-        align_dir: Directory that contains the output of running genomecov -d on the bed files obtaining mapping reads of all samples to contigs of all samples
-        output_dir: Location where the putputs of binnacle is written to.
+        threads: Number of processes reading the summary files
+    Output:
+        df_summary: The feature matrix
     '''
     files = listdir(summary_dir)
     files.sort()
-    df_summary = pd.DataFrame()
-    ctr = 0
-    for i in range(0, len(files)):
-        if 'Summary.txt' in files[i] and files[i][0] != '.':
-            print(files[i])
-            col_prefix = files[i].replace("_Summary.txt","")
-            df = pd.read_csv(summary_dir+files[i], names = ['Scaffold','Length','Span', col_prefix+'_Mu', col_prefix+'_Var'],
-                             sep='\t', index_col = 'Scaffold')
-            df[col_prefix+'_Var'] = df[col_prefix+'_Var']*df[col_prefix+'_Var']
-            print(df.head())
-            if ctr > 0:
-                del df['Span'], df['Length']
-            if ctr == 0:
-                df['Avg_Depth'] = 0
-                df = df[['Span','Avg_Depth',col_prefix+'_Mu',col_prefix+'_Var']]
-            ctr += 1
-            df_summary = df_summary.join(df, how = 'outer')
-    df_mu = df_summary.filter(regex='_Mu')
-    if binning_method.lower().startswith('metabat'):
-        df_summary['Avg_Depth'] = df_mu.mean(axis=1)
-    elif binning_method.lower().startswith('maxbin') or binning_method.lower().startswith('concoct'):
-        df_summary = df_mu
+    files = [f for f in files if 'Summary.txt' in f and f[0] != '.']
+    paths = [summary_dir+f for f in files]
+    prefixes = [f.replace("_Summary.txt","") for f in files]
+    print('Collating '+str(len(files))+' summary files')
+    if threads > 1:
+        ###Forked workers do not re-run the top level code of Collate.py
+        pool = mp.get_context('fork').Pool(threads)
+        summaries = pool.map(Read_Summary_File, paths)
+        pool.close()
+        pool.join()
     else:
-        del df_summary['Span'], df_summary['Avg_Depth']
-    print(df_summary.head())
-    return df_summary
\ No newline at end of file
+        summaries = [Read_Summary_File(path) for path in paths]
+    scaffolds = pd.Index(np.concatenate([ids for ids, s, mu, sigma in summaries]) if len(summaries) > 0 else []).unique().sort_values()
+    return Build_Feature_Matrix(scaffolds, prefixes, summaries, binning_method)
+
+def Write_Feature_Matrix_Binary(df_summary, output_path):
+    '''
+    Function to write the feature matrix to a numpy .npz file, with the values as a float32 matrix along 
+    with the scaffold ids and the column names. 
+    Input:
+        df_summary: The feature matrix
+        output_path: The location of the .npz file
+    '''
+    np.savez(output_path, matrix = df_summary.values.astype(np.float32), scaffolds = df_summary.index.values, 
+             columns = np.array(df_summary.columns, dtype = str))
@@ -7,8 +7,6 @@ Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
 '''
 
 import argparse as ap
-from Binnacle_IO_Utility import *
-from Clustering_Utility import *
 
 parser = ap.ArgumentParser(description="binnacle: A tool for binning metagenomic datasets using assembly graphs and scaffolds generated by metacarvel."+ 
                            "Estimate_Abundances.py estimates abundance for scaffolds generated by MetaCarvel. The program Collate.py collects the summary \
@@ -17,18 +15,26 @@ parser.add_argument("-d","--dir", help="Output directory that contains the summa
 parser.add_argument("-m","--method", help="Binning method to format the output to. Presently we support 1. Metabat 2. Maxbin 3. Concoct 4. Binnacle (Default)", 
                     required=False, default = 'binnacle')
 parser.add_argument("-k","--keep", default="True", help="Retain the summary files generated by Estimate_Abundances.py. Defaults to True", required=False)
+parser.add_argument("-T","--threads", default="1", help="Number of processes reading the summary files (Default=1)", required=False)
+parser.add_argument("-b","--binary", action="store_true", help="Also write the feature matrix as a float32 numpy matrix to Feature-Matrix-<method>.npz", required=False)
 args = parser.parse_args()
 
+from Binnacle_IO_Utility import *
+from Clustering_Utility import *
+
 summary_dir = args.dir
 summary_method = args.method
+threads = int(args.threads)
 
 if summary_dir[-1] != '/':
     summary_dir += '/'
     
-df_summary = Format_Outputs(summary_dir, summary_method)
-print(df_summary.head())
+df_summary = Format_Outputs(summary_dir, summary_method, threads)
 
 if summary_method.lower().startswith('metabat') or summary_method.lower().startswith('binnacle'):
     df_summary.to_csv(summary_dir+'Feature-Matrix-'+summary_method+'.txt', sep = '\t')
 else:
-    df_summary.to_csv(summary_dir+'Feature-Matrix-'+summary_method+'.txt', sep = '\t', header = False)
\ No newline at end of file
+    df_summary.to_csv(summary_dir+'Feature-Matrix-'+summary_method+'.txt', sep = '\t', header = False)
+
+if args.binary:
+    Write_Feature_Matrix_Binary(df_summary, summary_dir+'Feature-Matrix-'+summary_method+'.npz')
@@ -2,7 +2,11 @@ import argparse as ap
 import sys
 from Binnacle_IO_Utility import *
 from Clustering_Utility import *
-from packaging import version
+
+###The module, name and minimum version of the python packages binnacle depends on
+Package_Requirements = {'pandas':('pandas', 'Pandas', '0.23.4'), 'numpy':('numpy', 'Numpy', '1.15.4'), 
+                        'networkx':('networkx', 'Networkx', '2.2')}
+Tool_Packages = {'samtools':'Samtools', 'genomeCoverageBed':'Bedtools'}
 
 def cmd_exists(cmd):
     '''
@@ -12,35 +16,64 @@ def cmd_exists(cmd):
     Output:
         True if command exists, false otherwise. 
     '''
-    return subprocess.call("type " + cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE) == 0
+    return shutil.which(cmd) is not None
 
-def Check_Dependencies():
+def Package_Version(package, module):
     '''
-    Checks if all the dependencies are met! 
+    Function to find the installed version of a python package. The version is read from the metadata of the 
+    package when possible, which is faster than importing it. 
+    Input:
+        package: Name of the distribution of the package
+        module: Name of the module to import otherwise
+    Output:
+        The version of the package, None if it is not installed
+    '''
+    try:
+        from importlib.metadata import version
+        return version(package)
+    except ImportError:
+        pass
+    try:
+        return __import__(module).__version__
+    except ImportError:
+        return None
+
+def Required_Tools(bam_paths, bed_paths):
+    '''
+    Function to list the programs needed to compute the coverages of the inputs. 
+    Input:
+        bam_paths: The bam files given as input
+        bed_paths: The bed files given as input
+    Output:
+        tools: samtools and genomeCoverageBed for bam files, genomeCoverageBed for bed files
     '''
-    pd_version = pd.__version__
-    np_version = np.__version__
-    nx_version = nx.__version__
-    bio_version = bio.__version__
+    tools = []
+    if len(bam_paths) > 0:
+        tools.append('samtools')
+    if len(bam_paths) > 0 or len(bed_paths) > 0:
+        tools.append('genomeCoverageBed')
+    return tools
 
-    if version.parse(pd_version) < version.parse("0.23.4"):
-        print("Incompatible Pandas version. Install Pandas (>=0.23.4)")
-        return False
-    if version.parse(np_version) < version.parse("1.15.4"):
-        print("Incompatible Numpy version. Install Numpy (>=1.15.4)")
-        return False
-    if version.parse(nx_version) < version.parse("2.2"):
-        print("Incompatible Networkx version. Install Networkx (>=2.2)")
-        return False
-    if version.parse(bio_version) < version.parse("1.73"):
-        print("Incompatible Biopython version. Install Biopython (>=1.73)")
-        return False
-    if not cmd_exists('samtools'):
-        print('Samtools does not exist in PATH. Terminating....\n')#, file=sys.stderr)
-        return False
-    if not cmd_exists('genomeCoverageBed'):
-        print('Bedtools does not exist in PATH. Terminating....\n')#, file=sys.stderr)
-        return False
+def Check_Dependencies(packages=None, tools=None):
+    '''
+    Checks if all the dependencies are met! 
+    Input:
+        packages: The python packages of Package_Requirements to check, defaults to all of them
+        tools: The programs that have to be in PATH, defaults to samtools and genomeCoverageBed
+    '''
+    from packaging import version
+    if packages is None: packages = list(Package_Requirements)
+    if tools is None: tools = list(Tool_Packages)
+    for package in packages:
+        module, name, min_version = Package_Requirements[package]
+        installed = Package_Version(package, module)
+        if installed is None or version.parse(installed) < version.parse(min_version):
+            print("Incompatible "+name+" version. Install "+name+" (>="+min_version+")")
+            return False
+    for tool in tools:
+        if not cmd_exists(tool):
+            print(Tool_Packages[tool]+' does not exist in PATH. Terminating....\n')#, file=sys.stderr)
+            return False
     return True
 
 def Get_Coverage_Wrapper(bedpath, bampath, coveragepath, contigspath, coordspath, op_dir, prefix):
@@ -59,32 +92,10 @@ def Get_Coverage_Wrapper(bedpath, bampath, coveragepath, contigspath, coordspath
     '''
     if len(bedpath) > 0:
         if(not isfile(bedpath)):
-            print(bed_path +" file not found")
-            sys.exit(1)
-        if len(contigspath) > 0:
-            if(not isfile(contigspath)):
-                print(contigspath +" file not found")
-                sys.exit(1)    
-            faidx_cmd = 'samtools faidx '+contigspath 
-            result = subprocess.getoutput(faidx_cmd)
-            cut_cmd = 'cut -f 1,2 '+contigspath+'.fai > '+op_dir+prefix+'.length.txt'
-            result = subprocess.getoutput(cut_cmd)
-            length_path = op_dir+prefix+'.length.txt'
-        elif len(coordspath) > 0:
-            if(not isfile(coordspath)):
-                print(coordspath + " file not found")
-                sys.exit(1)
-            df_coords = pd.read_csv(coordspath, names = ['cc_aft_dlink', 'cc_bef_dlink', 'Contig', 'Start', 'End', 'Ingraph', 'Length'], 
-                                sep = '\t')
-            df_coords['Contig'] = df_coords['Contig'].astype(str)
-            df_length = df_coords[['Contig','Length']]
-            df_length = df_length.set_index('Contig')
-            df_length.to_csv(op_dir+prefix+'.length.txt', sep = "\t", header = False)
-            length_path = op_dir+prefix+'.length.txt'
-        else:
-            print("Please provide either coords file or the contigs file. \
-                   Failed to compute genome lengths for estimating perbase coverages from bedfile...\n")
+            print(bedpath +" file not found")
             sys.exit(1)
+        length_path = op_dir+prefix+'.length.txt'
+        Write_Length_File(contigspath, coordspath, length_path)
         coverage_path = Get_Coverage_Bed(bedpath, length_path, op_dir, prefix)
     elif len(bampath) > 0:
         if(not isfile(bampath)):
@@ -101,6 +112,65 @@ def Get_Coverage_Wrapper(bedpath, bampath, coveragepath, contigspath, coordspath
         sys.exit(1)
     return coverage_path
 
+def Write_Length_File(contigspath, coordspath, length_path):
+    '''
+    Function to write the genome file describing the lengths of the contigs used by genomeCoverageBed. 
+    Input:
+        contigspath: A fasta file describing contigs
+        coordspath: The coordinate system as computed by binnacle, used when contigspath is empty
+        length_path: Location of the genome file
+    '''
+    if len(contigspath) > 0:
+        if(not isfile(contigspath)):
+            print(contigspath +" file not found")
+            sys.exit(1)    
+        index = Load_FASTA_Index(contigspath)
+        with open(length_path, 'w') as f:
+            for contig, entry in index.items():
+                f.write(contig+'\t'+str(entry[0])+'\n')
+    elif len(coordspath) > 0:
+        if(not isfile(coordspath)):
+            print(coordspath + " file not found")
+            sys.exit(1)
+        df_coords = pd.read_csv(coordspath, names = ['cc_aft_dlink', 'cc_bef_dlink', 'Contig', 'Start', 'End', 'Ingraph', 'Length'], 
+                            sep = '\t')
+        df_coords['Contig'] = df_coords['Contig'].astype(str)
+        df_length = df_coords[['Contig','Length']]
+        df_length = df_length.set_index('Contig')
+        df_length.to_csv(length_path, sep = "\t", header = False)
+    else:
+        print("Please provide either coords file or the contigs file. \
+               Failed to compute genome lengths for estimating perbase coverages from bedfile...\n")
+        sys.exit(1)
+
+def Is_Coordinate_Sorted(bampath):
+    '''
+    Function to check if the header of a bam file declares the alignments sorted by coordinate. 
+    Input:
+        bampath: A bamfile describing coverages
+    Output:
+        True if the @HD line of the header has SO:coordinate, false otherwise. 
+    '''
+    header = subprocess.getoutput('samtools view -H '+bampath)
+    for line in header.split('\n'):
+        if line.startswith('@HD'):
+            return 'SO:coordinate' in line.split('\t')
+    return False
+
+def Get_Coverage_BAM_Command(bampath, opdir):
+    '''
+    Function to build the command running genomeCoverageBed with -bga -split on a bam file. The alignments 
+    are sorted first unless the bam file is already sorted by coordinate. 
+    Inputs:
+        bampath: A bamfile describing coverages.
+        opdir: Location for the temporary files of samtools sort
+    Output:
+        cov_cmd: Command writing the perbase coverages to its standard output
+    '''
+    if Is_Coordinate_Sorted(bampath):
+        return 'genomeCoverageBed -ibam '+bampath+' -bga -split'
+    return 'samtools sort -@ 4 -T '+opdir+' '+bampath+' | genomeCoverageBed -ibam stdin -bga -split'
+
 def Get_Coverage_BAM(bampath, opdir, prefix=""):
     '''
     Function to run genomeCoverageBed on bam file with -bga -split on ba file describing the alignments. 
@@ -109,12 +179,9 @@ def Get_Coverage_BAM(bampath, opdir, prefix=""):
         opdir: Location to write outputs to
         prefix: Prefix to attach to output files
     '''
-    cov_cmd = 'samtools sort -@ 4 -T '+opdir+' '+bampath+' | genomeCoverageBed -ibam stdin -bga -split > ' + opdir+prefix+'.read.coverage.txt'
+    cov_cmd = Get_Coverage_BAM_Command(bampath, opdir)+' > ' + opdir+prefix+'.read.coverage.txt'
     result = subprocess.getoutput(cov_cmd)
-    sort_cmd = 'LC_ALL=C sort -k1,1 '+opdir+prefix+'.read.coverage.txt > ' + opdir+prefix+'.read.coverage.sorted.txt'
-    result = subprocess.getoutput(sort_cmd)
-    remove(opdir+prefix+'.read.coverage.txt')
-    return opdir+prefix+'.read.coverage.sorted.txt'
+    return opdir+prefix+'.read.coverage.txt'
 
 def  Get_Coverage_Bed(bedpath, lengthpath, opdir, prefix=""):
     '''
@@ -127,7 +194,4 @@ def  Get_Coverage_Bed(bedpath, lengthpath, opdir, prefix=""):
     '''
     cov_cmd = 'sort -k 1,1 '+bedpath+'| genomeCoverageBed -i stdin -g '+lengthpath+' -bga -split > '+opdir+prefix+'.read.coverage.txt'
     result = subprocess.getoutput(cov_cmd)
-    sort_cmd = 'LC_ALL=C sort -k1,1 '+opdir+prefix+'.read.coverage.txt > ' + opdir+prefix+'.read.coverage.sorted.txt'
-    result = subprocess.getoutput(sort_cmd)
-    remove(opdir+prefix+'.read.coverage.txt')
-    return opdir+prefix+'.read.coverage.sorted.txt'
\ No newline at end of file
+    return opdir+prefix+'.read.coverage.txt'
\ No newline at end of file
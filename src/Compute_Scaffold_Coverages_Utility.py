@@ -8,8 +8,7 @@ Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
 
 import numpy as np
 import pandas as pd
-import networkx as nx
-from copy import deepcopy
+from Scaffold_Graph_Utility import *
 
 def Mean(group):
     '''
@@ -52,21 +51,42 @@ def Percentile(group, p):
     
 def Summarize_Coverages(df):
     '''
-    Function to estimate the summary of coverage values of a pandas group.
+    Function to estimate the summary of coverage values of a pandas group. The mean and deviation of all 
+    the contigs are computed in one pass from the length weighted sums of the depths and squared deviations, 
+    without expanding the intervals to perbase coverages. 
     Input:
         group: Pandas dtafarame containing coverages
     Output:
         returns the summary of coverage of each contig in the dataframe.
     '''
-    df['Length'] = df['End']-df['Start']
-    df_length = df[['ContigID', 'End']].groupby('ContigID').max().rename(columns = {'End':'Length'})
-    df_op = pd.DataFrame()
-    df_op['Mean'] = df.groupby('ContigID').apply(Mean)
-    df_op['Std'] = df.groupby('ContigID').apply(Deviation)
-    df_op = df_op.join(df_length)
-    df_op = df_op[['Length','Mean','Std']]
+    codes, contigs = pd.factorize(df['ContigID'], sort = True)
+    lengths = (df['End'].values - df['Start'].values).astype(np.float64)
+    depths = df['Coverage'].values.astype(np.float64)
+    num_contigs = len(contigs)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        span = np.bincount(codes, weights = lengths, minlength = num_contigs)
+        mean = np.bincount(codes, weights = lengths*depths, minlength = num_contigs)/span
+        var = np.bincount(codes, weights = lengths*(depths-mean[codes])**2, minlength = num_contigs)/span
+    df_op = pd.DataFrame(index = pd.Index(contigs, name = 'ContigID'))
+    df_op['Length'] = pd.Series(df['End'].values).groupby(codes).max().values
+    df_op['Mean'] = np.round(mean, 1)
+    df_op['Std'] = np.round(np.sqrt(var), 1)
     return df_op
 
+def Component_Subgraph(graph, nodes):
+    '''
+    Function to extract a connected component of the assembly graph, see Scaffold_Graph.subgraph. The nodes are 
+    numbered in the order of the node list and the edges keep the order of the assembly graph, so the coordinates 
+    assigned to the component do not depend on the iteration order of python sets.
+    Input:
+        graph: The oriented.gml created by MetaCarvel, as returned by Load_Assembly_Graph
+        nodes: Sorted array of the nodes in the component
+    Output:
+        subgraph: A Scaffold_Graph of the component with its own node and edge arrays and edge mask, its 
+                  node_ids and edge_ids are the ids in graph and the attribute tables are shared with graph
+    '''
+    return graph.subgraph(nodes)
+
 def Return_Starting_Point(subgraph):
     '''
     Function to return the starting point to assign coordinates on the global frame of reference. 
@@ -74,36 +94,93 @@ def Return_Starting_Point(subgraph):
     Input:
         subgraph: The graph pertaining to the DAG.
     Output:
-        min_node: Node with the lowest indegree
+        min_node: Node with the lowest indegree, -1 if no node has successors
         min_indegree: min_node's indegree
     '''
-    nodes = list(subgraph.nodes())
-    min_node, min_indegree = '', np.inf
-    for n in nodes:
-        if subgraph.in_degree(n) < min_indegree and subgraph.out_degree(n) > 0:
-            min_node, min_indegree = n, subgraph.in_degree(n)
-    return min_node, min_indegree
+    edges = subgraph.active_edges()
+    candidates = np.unique(subgraph.sources[edges])
+    if len(candidates) == 0:
+        return -1, np.inf
+    targets = np.sort(subgraph.targets[edges])
+    in_degree = np.searchsorted(targets, candidates, side = 'right') - np.searchsorted(targets, candidates, side = 'left')
+    i = np.argmin(in_degree)
+    return int(candidates[i]), int(in_degree[i])
 
-def Random_Simplify(subgraph_, min_indegree_node):
+def DFS_Back_Edges(subgraph, start_node):
     '''
-    Function to randomly simplify a simple cycle. This routine is only called if there are no available 
-    nodes in the graph to assign coordinates. 
-    Input: 
+    Function to find the back edges of a depth first search of the graph. Removing them leaves a DAG. 
+    The search starts from start_node and continues from the remaining nodes in the order of the graph. 
+    Input:
+        subgraph: A graph pertaining to the scaffold
+        start_node: Node to start the search from
+    Output:
+        back_edges: List of edges that close a cycle
+    '''
+    edges = subgraph.active_edges()
+    out_edges = {}
+    for e, u, v in zip(edges.tolist(), subgraph.sources[edges].tolist(), subgraph.targets[edges].tolist()):
+        out_edges.setdefault(u, []).append((e, v))
+    ###1: on the stack of the search, 2: done. Nodes without successors cannot close a cycle and are not 
+    ###used as roots. 
+    state = {}
+    back_edges = []
+    for root in [start_node] + list(out_edges.keys()):
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(out_edges.get(root, [])))]
+        while len(stack) > 0:
+            node, successors = stack[-1]
+            for e, succ in successors:
+                if state.get(succ, 0) == 1:
+                    back_edges.append(e)
+                elif succ not in state:
+                    state[succ] = 1
+                    stack.append((succ, iter(out_edges.get(succ, []))))
+                    break
+            else:
+                stack.pop()
+                state[node] = 2
+    return back_edges
+
+def Break_Cycles(subgraph_, min_indegree_node, method='dfs', max_cycles=None):
+    '''
+    Function to remove edges from a graph without a node to start assigning coordinates from, until it 
+    is acyclic. 
+    Input:
         subgraph_: A graph to simplify and usually contains one or more simple cycles.
-        min_indegree_node: Returns the node to simplify. We choose to simplify the node with the minimum 
-        indegree to simplify.
+        min_indegree_node: Node with the minimum indegree, the depth first search starts from it.
+        method: 'dfs' removes the back edges of a depth first search, in time linear in the size of the graph. 
+                'cycles' enumerates the simple cycles and removes the edge closing each of them, which takes 
+                exponential time on dense graphs. 
+        max_cycles: Number of simple cycles to enumerate with the 'cycles' method, the cycles left once it is 
+                    reached are broken by the depth first search. Defaults to no limit. 
     Output:
         subgraph: Returns the graph after simplification.
+        removed_edges: List of the edges removed from the graph
     '''
-    subgraph = deepcopy(subgraph_)
-    cycles = nx.simple_cycles(subgraph)
-    edges_removal_set = []
-    for c in cycles:
-        edge = (c[-1], c[0])
-        edges_removal_set += [edge]
-    edges_removal_set = set(edges_removal_set)
-    subgraph.remove_edges_from(list(edges_removal_set))
-    return subgraph
+    subgraph = subgraph_.copy()
+    removed_edges = []
+    if method == 'cycles':
+        ###networkx is only imported to enumerate the simple cycles
+        import networkx as nx
+        edges = subgraph_.active_edges()
+        cycle_graph = nx.DiGraph()
+        cycle_graph.add_nodes_from(subgraph_.active_nodes().tolist())
+        cycle_graph.add_edges_from(zip(subgraph_.sources[edges].tolist(), subgraph_.targets[edges].tolist(), 
+                                       ({'id':e} for e in edges.tolist())))
+        edges_removal_set = set()
+        for i, c in enumerate(nx.simple_cycles(cycle_graph)):
+            if max_cycles is not None and i >= max_cycles:
+                break
+            edge = cycle_graph.edges[c[-1], c[0]]['id']
+            if edge not in edges_removal_set:
+                edges_removal_set.add(edge)
+                removed_edges.append(edge)
+        subgraph.remove_edges(removed_edges)
+    back_edges = DFS_Back_Edges(subgraph, min_indegree_node)
+    subgraph.remove_edges(back_edges)
+    return subgraph, removed_edges + back_edges
 
 def Compute_Global_Coordinates(subgraph, v_0):
     '''
@@ -114,31 +191,37 @@ def Compute_Global_Coordinates(subgraph, v_0):
     Output:
         Returns a dictionary with contig ids as keys and coordinate values as values. 
     '''
-    v_0_orientation = subgraph.nodes[v_0]['orientation']
-    v_0_length = int(subgraph.nodes[v_0]['length'])
-    if v_0_orientation == 'FOW':
+    orientation_names = dict(enumerate(Edge_Orientations))
+    edges = subgraph.active_edges()
+    ###The neighbors of a node are visited in the order the undirected edges are first seen, and the overlap 
+    ###of a pair of contigs linked in both directions is the one of the edge seen last
+    neighbors, successors = {}, {}
+    for u, v, o, overlap in zip(subgraph.sources[edges].tolist(), subgraph.targets[edges].tolist(), 
+                                subgraph.orientation[edges].tolist(), subgraph.overlap[edges].tolist()):
+        successors.setdefault(u, {})[v] = orientation_names.get(o, '')
+        neighbors.setdefault(u, {})[v] = overlap
+        neighbors.setdefault(v, {})[u] = overlap
+    length = subgraph.length
+
+    v_0_length = int(length[v_0])
+    if not subgraph.reverse[v_0]:
         start = 0
         end = start + v_0_length
-    elif v_0_orientation == 'REV':
+    else:
         start = 0
         end = start-v_0_length
     global_coords = {v_0 : (start,end)}
-    nodes = list(subgraph.nodes())
-    visited = dict(zip(nodes, [False]*len(nodes)))
+    visited = set()
     Q = [v_0]
-    g_undir = subgraph.to_undirected()
     
     while len(Q) > 0:
         src = Q.pop()
-        visited[src] = True
-        neighbors = list(g_undir.neighbors(src))
-        for n in neighbors:
-            if subgraph.has_edge(src,n):
+        visited.add(src)
+        for n, edge_overlap in neighbors.get(src, {}).items():
+            if n in successors.get(src, {}):
                 ###Estimate n's coordinates based on the conting ordering src,n
-                edge = (src, n)
-                edge_orientation = subgraph.edges[edge]['orientation']
-                edge_overlap = int(float(g_undir.edges[edge]['mean']))
-                c2_length = int(g_undir.nodes[n]['length'])
+                edge_orientation = successors[src][n]
+                c2_length = int(length[n])
                 s1, e1 = global_coords[src]
                 if edge_orientation == 'EE':
                     e2 = e1 + edge_overlap
@@ -155,10 +238,8 @@ def Compute_Global_Coordinates(subgraph, v_0):
                 start,end = (s2, e2)
             else:
                 ###Estimate n's coordinates based on the conting ordering n,src
-                edge = (n,src)
-                edge_orientation = subgraph.edges[edge]['orientation']
-                edge_overlap = int(float(g_undir.edges[edge]['mean']))
-                c1_length = int(g_undir.nodes[n]['length'])
+                edge_orientation = successors[n][src]
+                c1_length = int(length[n])
                 s2, e2 = global_coords[src]
                 if edge_orientation == 'EE':
                     e1 = e2 - edge_overlap
@@ -178,78 +259,136 @@ def Compute_Global_Coordinates(subgraph, v_0):
                     global_coords[n] = (start,end)
             except KeyError:
                 global_coords[n] = (start,end)
-            if visited[n] == False:
-                visited[n] = True
+            if n not in visited:
+                visited.add(n)
                 Q.append(n)
     ###Normalize for the global coordinate system to start from 0
-    min_coord = np.inf
-    for g in global_coords:
-        start,end = global_coords[g]
-        min_val = min(start,end)
-        if min_val < min_coord:
-            min_coord = min_val
-    for g in global_coords:
-        s,e = global_coords[g]
-        global_coords[g] = s-min_coord, e-min_coord
-    return global_coords
+    min_coord = min(min(start, end) for start, end in global_coords.values())
+    labels = subgraph.labels
+    return dict((labels[g], (s-min_coord, e-min_coord)) for g, (s, e) in global_coords.items())
+
+def Get_Contig_Coverages(read_coverage, contigs):
+    '''
+    Function to gather the -bga intervals of a list of contigs from the coverages loaded by Load_Read_Coverage. 
+    Input:
+        read_coverage: Coverage intervals and the per contig offset table returned by Load_Read_Coverage
+        contigs: List of contigs
+    Output:
+        which: Position in the list of contigs of the contig each interval belongs to
+        starts, ends, depths: The intervals of the contigs. Contigs without coverage have no intervals.
+    '''
+    ids = read_coverage['contigs'].get_indexer(contigs)
+    found = np.flatnonzero(ids >= 0)
+    offsets = read_coverage['offsets']
+    first = offsets[ids[found]]
+    counts = offsets[ids[found]+1] - first
+    which = np.repeat(found, counts)
+    gather = np.arange(np.sum(counts)) + np.repeat(first - (np.cumsum(counts) - counts), counts)
+    return which, read_coverage['starts'][gather], read_coverage['ends'][gather], read_coverage['depths'][gather]
 
-def Compute_Coverage(df_coverage, coords):
+def Compute_Coverage_RLE(read_coverage, coords):
     '''
-    Function to compute the coverages of the DAG based on the coordinates assigned by the previous functions. 
+    Function to compute the run length encoded coverage of the DAG directly from the -bga intervals of 
+    its contigs. The intervals are projected onto the global frame of reference and merged with a sweep 
+    line, so the perbase coverage vector is never materialized. Contigs without coverage are treated as 
+    having no reads mapped to them. 
     Input:
-        df_coverage: A pandas dataframe containing the perbase of coverage of the contigs in the DAG.
+        read_coverage: Coverage intervals of the contigs returned by Load_Read_Coverage
         coords: A dictionary containing the start and end points of the contig in the global frame of reference. 
+    Output:
+        bounds: Run boundaries along the scaffold, bounds[i] to bounds[i+1] is the i-th run and bounds[-1] is the span
+        values: Coverage of each run
+    '''
+    contigs = list(coords.keys())
+    s = np.array([coords[c][0] for c in contigs], dtype = np.int64)
+    e = np.array([coords[c][1] for c in contigs], dtype = np.int64)
+    span = int(max(s.max(), e.max())) + 1
+    lengths = np.abs(s-e)
+
+    idx, starts, ends, depths = Get_Contig_Coverages(read_coverage, contigs)
+    lo = np.clip(starts.astype(np.int64), 0, lengths[idx])
+    hi = np.clip(ends.astype(np.int64), 0, lengths[idx])
+    depth = depths.astype(np.float64)
+    forward = s[idx] <= e[idx]
+    run_start = np.where(forward, s[idx] + lo, s[idx] - hi + 1)
+    run_end = np.where(forward, s[idx] + hi, s[idx] - lo + 1)
+    nonempty = hi > lo
+
+    pos = np.concatenate(([0, span], run_start[nonempty], run_end[nonempty]))
+    delta = np.concatenate(([0.0, 0.0], depth[nonempty], -depth[nonempty]))
+    bounds, inverse = np.unique(pos, return_inverse = True)
+    level = np.cumsum(np.bincount(inverse.ravel(), weights = delta))[:-1] + 0.0
+    run_ids = np.concatenate(([0], np.flatnonzero(np.diff(level)) + 1))
+    return np.append(bounds[run_ids], span), level[run_ids]
+
+def Summarize_Coverage_RLE(coverage_rle):
+    '''
+    Function to estimate the mean, deviation and span of a run length encoded coverage. 
+    Input:
+        coverage_rle: Run boundaries and values as returned by Compute_Coverage_RLE
+    Output:
+        mu: Mean coverage of the scaffold
+        dev: Standard deviation of the coverage of the scaffold
+        span: Span of the scaffold
+    '''
+    bounds, values = coverage_rle
+    span = int(bounds[-1])
+    run_lengths = np.diff(bounds)
+    mean = np.float64(np.sum(run_lengths*values))/span
+    var = np.sum(run_lengths*(values-mean)**2)/span
+    return round(mean,1), round(np.sqrt(var),1), span
+
+def Expand_Coverage_RLE(coverage_rle):
+    '''
+    Function to expand a run length encoded coverage into the perbase coverage vector. 
+    Input:
+        coverage_rle: Run boundaries and values as returned by Compute_Coverage_RLE
     Output:
         A coverage vector for the entire DAG
     '''
-    top_sort = list(coords.keys())
-    max_coord = -np.inf
-    for c in top_sort:
-        max_v = max(coords[c])
-        if max_v >= max_coord: max_coord = max_v
-    coverage = np.zeros(max_coord+1)
-    cov_ctr = df_coverage.reset_index().groupby(['Contig']).count()
-    cov_ctr = dict(zip(cov_ctr.index.tolist(), cov_ctr['Start'].tolist()))
-    try:
-        for c in top_sort:
-            s,e = coords[c]
-            cov_coords = df_coverage.loc[c]
-            if cov_ctr[c] > 1: loc, cov_contig = list(zip(cov_coords['Start'].tolist(), cov_coords['End'].tolist())),cov_coords['coverage'].tolist()
-            else:  loc, cov_contig = list(zip([cov_coords['Start']], [cov_coords['End']])), [cov_coords['coverage']]
-            contig_depth = np.zeros(np.abs(s-e))
-            for i in range(len(loc)):
-                l = loc[i]
-                contig_depth[l[0]:l[1]] = cov_contig[i]
-            if (s > e): coverage[s:e:-1] += contig_depth
-            else: coverage[s:e] += contig_depth
-            assert np.abs(s-e) == len(contig_depth), top_sort
-    except Exception as e:
-        print(e)
-        print('Here')
-        print('Did you sort the coverage files by contig ids before running binnacle???? Exiting with error...\n')
-    return coverage
+    bounds, values = coverage_rle
+    return np.repeat(values, np.diff(bounds))
 
 def Helper_Changepoints_Z_Stat(cov_vec, window_size):
     
     '''Function to compute outliers in coverage signals. We use the two sample two sample Z-tests. 
     The z-statistic is calculated by z = \frac{\mu_1-\mu_2}{\sqrt{\sigma_1^2+\sigma_2^2}}
+    The means and deviations of the sliding windows are computed from prefix sums of the coverages and 
+    their squares, so the cost is linear in the span and several window sizes share the prefix sums. 
     Input:
         cov_vec: The Coverage Vector estimated by the previous function. 
         window_size: Defaulting to 1500, this is the window size to identify change points. 
+                     A list of window sizes computes the statistic for each of them. 
     Output:
-        cpts: A vector of the change point statistic'''
+        cpts: A vector of the change point statistic, or a matrix with a row per window size'''
     
-    indices_non_zero = np.where(cov_vec > 0)
+    indices_non_zero = np.flatnonzero(cov_vec > 0)
     sliced = cov_vec[indices_non_zero]
-    while window_size >= len(sliced)/2:
-        window_size = int(window_size/5)
-    mean = np.array(pd.Series(sliced).rolling(window_size).mean())[window_size-1:]
-    sd = np.array(pd.Series(sliced).rolling(window_size).std())[window_size-1:]
-    mu_1, mu_2 = mean[0:len(mean)-window_size-1], mean[window_size+1:]
-    sd_1, sd_2 = sd[0:len(sd)-window_size-1],sd[window_size+1:]
-    test_stat = [0]*window_size + list((mu_1 - mu_2)/(np.sqrt(sd_1**2+sd_2**2))) + [0]*window_size
-    cpts = np.zeros(len(cov_vec))
-    cpts[indices_non_zero] = test_stat
+    ###Coverages are integral, integer prefix sums keep the windowed variances exact
+    if np.array_equal(sliced, np.floor(sliced)): sliced = sliced.astype(np.int64)
+    sum_1 = np.concatenate(([0], np.cumsum(sliced)))
+    sum_2 = np.concatenate(([0], np.cumsum(sliced*sliced)))
+    windows = np.atleast_1d(window_size)
+    cpts = np.zeros((len(windows), len(cov_vec)))
+    for k in range(len(windows)):
+        w = int(windows[k])
+        while w >= len(sliced)/2 and w > 0:
+            w = int(w/5)
+        if w < 2: continue
+        s_1 = sum_1[w:] - sum_1[:-w]
+        s_2 = sum_2[w:] - sum_2[:-w]
+        mean = s_1/w
+        var = np.maximum((w*s_2 - s_1*s_1)/(w*(w-1)), 0)
+        mu_1, mu_2 = mean[0:len(mean)-w-1], mean[w+1:]
+        pooled_sd = np.sqrt(var[0:len(var)-w-1] + var[w+1:])
+        ###Pairs of flat windows are scaled by the smallest non-zero deviation of the scaffold instead of 
+        ###producing inf/nan, which would turn the percentile cutoffs into nan
+        flat = pooled_sd == 0
+        if np.any(flat):
+            pooled_sd[flat] = np.min(pooled_sd[~flat]) if np.any(~flat) else 1.0
+        cpts[k, indices_non_zero[w:len(sliced)-w]] = (mu_1 - mu_2)/pooled_sd
+    if np.ndim(window_size) == 0:
+        return cpts[0]
     return cpts
 
 def ID_outliers(change_point_vec, thresh):
@@ -306,8 +445,8 @@ def Get_Outlier_Contigs(outliers, positions, coordinates, graph, pos_cutoff):
     |          End       | Delink successor    | Delink predecessor|
     Input:
         outliers: Set of outliers identified by running the previous routines. 
-        positions: A dictionary that has keys equal to the length of the span of the scaffold 
-                   and for each position we record the contigs intersecting at that coordinate
+        positions: Index of the contigs intersecting each coordinate of the scaffold as returned by 
+                   Return_Contig_Scaffold_Positions
         coordinates: A dictionary contianing the startting and ending positions along a 
                      global frame reference for a scaffold for each contig. 
         graph: A graph of the scaffold.
@@ -315,15 +454,13 @@ def Get_Outlier_Contigs(outliers, positions, coordinates, graph, pos_cutoff):
     Output:
         g_ : delinked graph
     '''
-    g_ = deepcopy(graph)
+    g_ = graph.copy()
+    node_ids = dict(zip(graph.labels, range(graph.number_of_nodes())))
     potential_contigs_removal = {}
     counter_end_points = 0
-    for o in outliers:
-        try:
-            contigs_intersecting = positions[o]
-        except KeyError:
-            print('Here')
-            print('KeyError', o, np.max(list(positions.keys())))
+    for o, contigs_intersecting in zip(outliers, Query_Contig_Scaffold_Positions(positions, outliers)):
+        ###Changepoints beyond the contigs of the scaffold have no contig to delink
+        if len(contigs_intersecting) == 0:
             continue
         closest_contig, closest_contig_val = '',np.inf
         forward, start = True, True
@@ -351,48 +488,58 @@ def Get_Outlier_Contigs(outliers, positions, coordinates, graph, pos_cutoff):
             
     for c in potential_contigs_removal:
         p = potential_contigs_removal[c]
-        fwd, start = p[2], p[3]       
+        fwd, start = p[2], p[3]
+        node = node_ids[str(c)]
         if(fwd == True) and (start == True): 
-            predecessors = list(g_.predecessors(str(c)))
-            if len(predecessors) > 0:
-                edges = [(pred,c) for pred in predecessors]
-                g_.remove_edges_from(edges)
+            g_.remove_edges(g_.in_edges_of(node))
         if(fwd == False) and (start == True): 
-            successors = list(g_.successors(str(c)))
-            if len(successors) > 0:
-                edges = [(c,succ) for succ in successors]
-                g_.remove_edges_from(edges)
+            g_.remove_edges(g_.out_edges(node))
         if(fwd == False) and (start == False): 
-            predecessors = list(g_.predecessors(str(c)))
-            if len(predecessors) > 0:
-                edges = [(pred,c) for pred in predecessors]
-                g_.remove_edges_from(edges)
+            g_.remove_edges(g_.in_edges_of(node))
         if(fwd == True) and (start == False): 
-            successors = list(g_.successors(str(c)))
-            if len(successors) > 0:
-                edges = [(c,succ) for succ in successors]
-                g_.remove_edges_from(edges)
+            g_.remove_edges(g_.out_edges(node))
     return g_
 
 def Return_Contig_Scaffold_Positions(coordinate_dictionary):
     '''
-    Function to return a dictionary that has keys equal to the span of the scaffold and 
-    for each position we record the contigs intersecting at that coordinate
+    Function to return an index of the intervals spanned by the contigs along the scaffold, used to look up 
+    the contigs intersecting a coordinate. The contigs are sorted by their leftmost coordinate, so the index 
+    grows with the number of contigs and not with the span of the scaffold. 
     Input: 
         coordinate_dictionary: A dictionary contianing the startting and ending positions along a global 
                                frame reference for a scaffold for each contig.
     Output:
-        pos_dict: The forementioned dictionary that has keys that are positions and the values with
-                  the contigs at that position. 
-    '''
-    pos_dict = {}
-    for c in coordinate_dictionary.keys():
-        start, end = coordinate_dictionary[c]
-        if start > end: a,b = end, start
-        else: a,b = start,end
-        for i in range(a, b+1):
-            try: 
-                pos_dict[i].append(c)
-            except KeyError: 
-                pos_dict[i] = [c]
-    return pos_dict
\ No newline at end of file
+        pos_index: A dictionary with the contigs, the leftmost and rightmost coordinates of the contigs sorted 
+                   by the leftmost coordinate, the rank of the contigs in the coordinate dictionary and the 
+                   length of the longest contig. 
+    '''
+    contigs = list(coordinate_dictionary.keys())
+    s = np.array([coordinate_dictionary[c][0] for c in contigs], dtype = np.int64)
+    e = np.array([coordinate_dictionary[c][1] for c in contigs], dtype = np.int64)
+    lo, hi = np.minimum(s, e), np.maximum(s, e)
+    order = np.argsort(lo, kind = 'stable')
+    pos_index = {'contigs':[contigs[i] for i in order], 'lo':lo[order], 'hi':hi[order], 'rank':order,
+                 'max_length':int(np.max(hi-lo)) if len(contigs) > 0 else 0}
+    return pos_index
+
+def Query_Contig_Scaffold_Positions(pos_index, positions):
+    '''
+    Function to look up the contigs intersecting each of a set of coordinates along the scaffold. 
+    Input:
+        pos_index: Index returned by Return_Contig_Scaffold_Positions
+        positions: Array of coordinates along the scaffold
+    Output:
+        contigs_intersecting: For every coordinate, the list of contigs intersecting it in the order of 
+                              the coordinate dictionary the index was built from
+    '''
+    positions = np.asarray(positions, dtype = np.int64)
+    lo, hi, rank = pos_index['lo'], pos_index['hi'], pos_index['rank']
+    first = np.searchsorted(lo, positions - pos_index['max_length'], side = 'left')
+    last = np.searchsorted(lo, positions, side = 'right')
+    contigs_intersecting = []
+    for i in range(len(positions)):
+        candidates = np.arange(first[i], last[i])
+        candidates = candidates[hi[first[i]:last[i]] >= positions[i]]
+        candidates = candidates[np.argsort(rank[candidates], kind = 'stable')]
+        contigs_intersecting.append([pos_index['contigs'][j] for j in candidates])
+    return contigs_intersecting
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Program developed at Pop lab at the CBCB, University of Maryland by
+Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
+'''
+
+import argparse as ap
+import sys
+from Coverage_Tracks_Utility import *
+
+parser = ap.ArgumentParser(description="binnacle: A tool for binning metagenomic datasets using assembly graphs and scaffolds generated by metacarvel. \
+                           Coverage_Tracks.py reads the coverages of scaffolds from the track stores Coverages_Before_Delinking.tracks and \
+                           Coverages_After_Delinking.tracks written by Estimate_Abundances.py with -ct. Only the requested scaffolds are read \
+                           from the store. Without -i the scaffolds in the store are listed.")
+parser.add_argument("-s","--store", help="Track store written by Estimate_Abundances.py", required=True)
+parser.add_argument("-i","--ids", default="", help="Comma separated ids of the scaffolds to write the coverage of", required=False)
+parser.add_argument("-r","--region", default="", help="Region of the scaffolds to write the coverage of, as START-END (Default=whole scaffold)", required=False)
+parser.add_argument("-int","--integer_depths", action="store_true", help="Write the depths as integers", required=False)
+args = parser.parse_args()
+
+try:
+    store = Coverage_Track_Store(args.store)
+except IOError as e:
+    print(e)
+    sys.exit(1)
+
+if args.ids == "":
+    ###Lists the scaffolds with the number of runs of their coverage and their span
+    sys.stdout.write('Id\tId_Before_Delinking\tRuns\tSpan\n')
+    runs = np.diff(np.append(store.index[:, 2], len(store.starts)))
+    for row, num_runs in zip(store.index.tolist(), runs.tolist()):
+        sys.stdout.write(str(row[0])+'\t'+str(row[1])+'\t'+str(num_runs)+'\t'+str(row[3])+'\n')
+    sys.exit(0)
+
+if args.region != "":
+    region = args.region.split('-')
+    if len(region) != 2:
+        print('Please specify the region as START-END')
+        sys.exit(1)
+    start, end = int(region[0]), int(region[1])
+
+for track_id in args.ids.split(','):
+    try:
+        if args.region != "":
+            coverage_rle = store.region(int(track_id), start, end)
+        else:
+            coverage_rle = store.track(int(track_id))
+    except KeyError as e:
+        print(e.args[0])
+        sys.exit(1)
+    ###The scaffolds after delinking are written with their id before delinking, as in Coverages_After_Delinking.txt, 
+    ###which writes the id before delinking first for the scaffolds that were not split
+    if store.delinked:
+        id_before = store.id_before_delinking(int(track_id))
+        if store.split(int(track_id)):
+            outmat = Compress_Coverage_RLE(coverage_rle, id_before, track_id, args.integer_depths)
+        else:
+            outmat = Compress_Coverage_RLE(coverage_rle, track_id, id_before, args.integer_depths)
+    else:
+        outmat = Compress_Coverage_RLE(coverage_rle, track_id, integer_depths = args.integer_depths)
+    sys.stdout.write(outmat)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Program developed at Pop lab at the CBCB, University of Maryland by
+Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
+'''
+
+import json
+import numpy as np
+from os import mkdir, stat
+from os.path import isdir, isfile
+
+def Compress_Coverage_RLE(Coverage_RLE, id_before_delinking, id_after_delinking='', integer_depths=False):
+    '''
+    Function to write a run length encoded coverage in a format similar to the BGA split format, one row per 
+    run. The rows of all the runs are formatted at once.
+    Input:
+        Coverage_RLE: Run boundaries and values of the scaffold as returned by Compute_Coverage_RLE
+        id_before_delinking: scaffold id before delinking based on chnagepoints
+        id_after_delinking: scaffold id of the scaffold under study
+        integer_depths: Write the depths as integers instead of floats
+    Output:
+        out_mat: Returns the compresed coverage matrix. 
+    '''
+    bounds, values = Coverage_RLE
+    if len(values) == 0:
+        return ''
+    if id_after_delinking == '':
+        row_id = str(id_before_delinking)+'\t'
+    else:
+        row_id = str(id_after_delinking)+'\t'+str(id_before_delinking)+'\t'
+    if integer_depths: depths = np.rint(values).astype(np.int64).astype(str)
+    else: depths = values.astype(str)
+    rows = zip(bounds[:-1].astype(str), bounds[1:].astype(str), depths)
+    return row_id + ('\n'+row_id).join(map('\t'.join, rows)) + '\n'
+
+###A track store is a directory holding the run length encoded coverages of the scaffolds as flat binary
+###columns. index.bin has one row of Track_Index_Columns per scaffold, starts.bin and depths.bin have the
+###start and the coverage of every run, the runs of a scaffold are contiguous and the index points to the first.
+Coverage_Track_Version = 3
+Track_Store_Files = ['index.bin', 'starts.bin', 'depths.bin']
+Track_Index_Columns = ['Id', 'Id_Before_Delinking', 'Run_Offset', 'Span', 'Split']
+
+def Create_Track_Store(store_dir, delinked=False):
+    '''
+    Function to create an empty track store, the tracks are appended with Write_Coverage_Track.
+    Input:
+        store_dir: Directory of the store
+        delinked: The store holds the scaffolds after delinking, identified by their id and their id before 
+                  delinking as in Coverages_After_Delinking.txt
+    '''
+    if not isdir(store_dir):
+        mkdir(store_dir)
+    with open(store_dir+'/tracks.json', 'w') as f:
+        json.dump({'version':Coverage_Track_Version, 'delinked':delinked, 'index':Track_Index_Columns, 'index_dtype':'<i8',
+                   'starts_dtype':'<i8', 'depths_dtype':'<f8'}, f)
+
+def Write_Coverage_Track(writers, coverage_rle, track_id, id_before_delinking, split=False):
+    '''
+    Function to append the coverage of a scaffold to a track store.
+    Input:
+        writers: The index.bin, starts.bin and depths.bin files of the store opened for appending
+        coverage_rle: Run boundaries and values of the scaffold as returned by Compute_Coverage_RLE
+        track_id: Id of the scaffold, the tracks are looked up by it
+        id_before_delinking: Id of the scaffold before delinking
+        split: The scaffold is a part of a scaffold split by delinking
+    '''
+    wb_index, wb_starts, wb_depths = writers
+    bounds, values = coverage_rle
+    row = np.array([track_id, id_before_delinking, wb_starts.tell()//8, bounds[-1], int(split)], dtype = '<i8')
+    wb_index.write(row.tobytes())
+    wb_starts.write(np.asarray(bounds[:-1], dtype = '<i8').tobytes())
+    wb_depths.write(np.asarray(values, dtype = '<f8').tobytes())
+
+def Map_Track_Column(path, dtype):
+    '''
+    Function to memory map a column of a track store read only, numpy can not map an empty file.
+    '''
+    if stat(path).st_size == 0:
+        return np.zeros(0, dtype = dtype)
+    return np.memmap(path, dtype = dtype, mode = 'r')
+
+class Coverage_Track_Store:
+    '''
+    Memory mapped, read only view of a track store. Looking up a scaffold reads its row of the index and the
+    slices of the runs, the files are never parsed or loaded as a whole.
+    Attributes:
+        index: Array with one row of Track_Index_Columns per scaffold
+        starts, depths: The start and coverage of every run
+        delinked: The store holds the scaffolds after delinking, see Create_Track_Store
+    '''
+    def __init__(self, store_dir):
+        if not isfile(store_dir+'/tracks.json'):
+            raise IOError(store_dir+' is not a coverage track store')
+        with open(store_dir+'/tracks.json') as f:
+            header = json.load(f)
+        if header['version'] != Coverage_Track_Version:
+            raise IOError(store_dir+' was written by an incompatible version of binnacle')
+        self.delinked = header['delinked']
+        self.index = Map_Track_Column(store_dir+'/index.bin', header['index_dtype']).reshape(-1, len(Track_Index_Columns))
+        self.starts = Map_Track_Column(store_dir+'/starts.bin', header['starts_dtype'])
+        self.depths = Map_Track_Column(store_dir+'/depths.bin', header['depths_dtype'])
+
+    def __len__(self):
+        return len(self.index)
+
+    def ids(self):
+        '''
+        Function to return the ids of the scaffolds in the store.
+        '''
+        return np.asarray(self.index[:, 0])
+
+    def row(self, track_id):
+        '''
+        Function to find the row of a scaffold in the index. binnacle numbers the scaffolds from 1 in the order
+        they are written so the row is found directly, other ids fall back to a search.
+        '''
+        if 0 < track_id <= len(self.index) and self.index[track_id-1, 0] == track_id:
+            return track_id-1
+        rows = np.flatnonzero(self.index[:, 0] == track_id)
+        if len(rows) == 0:
+            raise KeyError('Scaffold '+str(track_id)+' is not in the store')
+        return int(rows[0])
+
+    def runs(self, track_id):
+        '''
+        Function to return the runs of a scaffold without copying them.
+        Input:
+            track_id: Id of the scaffold
+        Output:
+            starts: Start of every run
+            depths: Coverage of every run
+            span: Span of the scaffold, the last run ends there
+        '''
+        r = self.row(track_id)
+        first = int(self.index[r, 2])
+        last = int(self.index[r+1, 2]) if r+1 < len(self.index) else len(self.starts)
+        return self.starts[first:last], self.depths[first:last], int(self.index[r, 3])
+
+    def track(self, track_id):
+        '''
+        Function to return the run length encoded coverage of a scaffold.
+        Input:
+            track_id: Id of the scaffold
+        Output:
+            bounds: Run boundaries along the scaffold, as returned by Compute_Coverage_RLE
+            values: Coverage of each run
+        '''
+        starts, depths, span = self.runs(track_id)
+        return np.append(starts, span), depths
+
+    def region(self, track_id, start, end):
+        '''
+        Function to return the run length encoded coverage of a region of a scaffold, the runs overlapping the
+        region are clipped to it.
+        Input:
+            track_id: Id of the scaffold
+            start, end: Half open interval of positions along the scaffold
+        Output:
+            bounds: Run boundaries within the region
+            values: Coverage of each run
+        '''
+        starts, depths, span = self.runs(track_id)
+        start, end = max(int(start), 0), min(int(end), span)
+        if start >= end:
+            return np.array([start], dtype = np.int64), depths[:0]
+        lo = max(int(np.searchsorted(starts, start, side = 'right')) - 1, 0)
+        hi = int(np.searchsorted(starts, end, side = 'left'))
+        bounds = np.append(starts[lo:hi], end)
+        bounds[0] = start
+        return bounds, depths[lo:hi]
+
+    def id_before_delinking(self, track_id):
+        '''
+        Function to return the id before delinking of a scaffold.
+        '''
+        return int(self.index[self.row(track_id), 1])
+
+    def split(self, track_id):
+        '''
+        Function to return whether a scaffold is a part of a scaffold split by delinking.
+        '''
+        return bool(self.index[self.row(track_id), 4])
@@ -5,7 +5,9 @@
 Program developed at Pop lab at the CBCB, University of Maryland by 
 Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel. 
 '''
-from Compute_Contig_Coverage_Utility import *
+
+import argparse as ap
+import itertools
 
 parser = ap.ArgumentParser(description="binnacle: A tool for binning metagenomic datasets using assembly graphs and scaffolds generated by metacarvel.\
                            Estimate_Abundances.py estimates abundance for scaffolds generated by MetaCarvel. \
@@ -17,6 +19,8 @@ parser = ap.ArgumentParser(description="binnacle: A tool for binning metagenomic
                            running the genomeCoverageBed program of the bedtools suite.")
 parser.add_argument("-g","--assembly", help="Assembly Graph generated by Metacarvel", default="", required=False)
 parser.add_argument("-a","--coverage", help="Output generated by running genomecov -d on the bed file generated by MetaCarvel.",default="", required=False)
+parser.add_argument("-A","--coverage_list", help="File listing the coverage files (or BAM/BED files) of several samples, one per line. The abundances of the scaffolds \
+in the coordinates file (-o) are estimated in every sample in a single run and written along with the feature matrix Feature-Matrix-binnacle.txt", default="", required=False)
 parser.add_argument("-bam","--bamfile", help="Bam file from aligning reads to contigs",default="", required = False)
 parser.add_argument("-bed","--bedfile", help="Bed file from aligning reads to contigs. If bed file is provided please provide a fasta file of the contigs",default="", required = False)
 parser.add_argument("-c",'--contigs', help="Contigs generated by the assembler, contigs.fasta",default="", required=False)
@@ -27,18 +31,48 @@ parser.add_argument("-w","--window_size", default="1500",help="Size of the slidi
 parser.add_argument("-t","--threshold", default="99",help="Threshold to identify outliers (Default=99)", required = False)
 parser.add_argument("-n","--neighbor_cutoff", default="100", help="Filter size to identify outliers within (Defualt=100)", required = False)
 parser.add_argument("-p","--poscutoff", default="100",help="Position cutoff to consider delinking (Default=100)", required = False)
+parser.add_argument("-cb","--cycle_breaking", default="dfs", choices=["dfs","cycles"], help="Method to break cycles in scaffolds without a \
+starting node. dfs removes the back edges of a depth first search, cycles removes an edge from every simple cycle and can take exponential time (Default=dfs)", required = False)
+parser.add_argument("-mc","--max_cycles", default="", help="Number of simple cycles enumerated per scaffold with -cb cycles, the rest are broken by dfs \
+(Default=no limit)", required = False)
 parser.add_argument("-pre","--prefix", default="", help="Prefix to be attached to all outputs", required = False)
+parser.add_argument("-int","--integer_depths", action="store_true", help="Write the depths in Coverages_Before/After_Delinking.txt as integers", required = False)
+parser.add_argument("-el","--edge_list", action="store_true", help="Also write the edges of Assembly_Graph_Filtered.gml to Assembly_Graph_Filtered.tsv", required = False)
+parser.add_argument("-ct","--coverage_tracks", action="store_true", help="Also write the coverages of the scaffolds to the binary track stores \
+Coverages_Before_Delinking.tracks and Coverages_After_Delinking.tracks, read by Coverage_Tracks.py", required = False)
+parser.add_argument("-kc","--keep_coverage", action="store_true", help="Write the coverages computed from a bam file to <prefix>.read.coverage.txt. \
+By default the output of genomeCoverageBed is streamed into binnacle without writing it to disk", required = False)
+parser.add_argument("-T","--threads", default="1", help="Number of processes used to compute the coverages of the connected components (Default=1)", required = False)
+parser.add_argument("-m","--metrics", action="store_true", help="Record the peak memory of every stage, and of the worker processes with -T, and write the \
+running time, peak memory and counters of every stage to [<prefix>_]Metrics.json \
+and the size, span, coverage and running time of every connected component to [<prefix>_]Metrics_Components.tsv", required = False)
+parser.add_argument("-r","--resume", action="store_true", help="Continue an interrupted run in the same output directory from the last connected component \
+recorded in Coverage_Outputs.journal instead of starting over", required = False)
+parser.add_argument("-sw","--sweep", action="store_true", help="Sweep over the comma separated values of -w, -t, -n and -p given, such as -w 500,1500 -t 95,99. \
+The coordinates and coverages of the scaffolds are computed once and the outputs of every combination of the values are written to a directory named \
+after it, such as w1500_t99_n100_p100, along with the comparison of the combinations Sweep_Summary.txt", required = False)
+parser.add_argument("-q","--quiet", action="store_true", help="Do not print the running time of the stages as they complete", required = False)
 
-if(not(Check_Dependencies())):
+args = parser.parse_args()
+
+###The dependencies are imported once the arguments are parsed, so that --help does not wait for them
+from Compute_Contig_Coverage_Utility import *
+
+bam_paths, bed_paths = [args.bamfile] if args.bamfile != "" else [], [args.bedfile] if args.bedfile != "" else []
+if args.coverage_list != "" and isfile(args.coverage_list):
+    sample_paths = [line.strip() for line in open(args.coverage_list)]
+    bam_paths += [path for path in sample_paths if path.endswith('.bam')]
+    bed_paths += [path for path in sample_paths if path.endswith('.bed')]
+packages = ['pandas', 'numpy'] + (['networkx'] if args.cycle_breaking == 'cycles' else [])
+if(not(Check_Dependencies(packages, Required_Tools(bam_paths, bed_paths)))):
     print("Fix Unmet Dependencies")
     sys.exit(1)
 
-args = parser.parse_args()
-
 graph_path = args.assembly
 bed_path = args.bedfile
 bam_path = args.bamfile
 coverage_path  =  args.coverage
+coverage_list_path = args.coverage_list
 output_dir = args.dir
 contigs_path = args.contigs
 coords_path = args.coords
@@ -51,15 +85,78 @@ coverage_path  =  args.coverage
 output_dir = args.dir
 Contigs_Path = args.contigs
 coords_path = args.coords
-w = int(args.window_size)
-t = float(args.threshold)
-n = int(args.neighbor_cutoff)
-p = int(args.poscutoff)
+window_sizes = [int(v) for v in args.window_size.split(',')]
+thresholds = [float(v) for v in args.threshold.split(',')]
+neighbor_cutoffs = [int(v) for v in args.neighbor_cutoff.split(',')]
+poscutoffs = [int(v) for v in args.poscutoff.split(',')]
+if not args.sweep and max(len(window_sizes), len(thresholds), len(neighbor_cutoffs), len(poscutoffs)) > 1:
+    print('Please specify -sw to sweep over several values of -w, -t, -n and -p')
+    sys.exit(1)
+if args.sweep and (coords_path != "" or coverage_list_path != "" or args.resume):
+    print('-sw computes the scaffolds from scratch, it can not be combined with -o, -A or -r')
+    sys.exit(1)
+w, t, n, p = window_sizes[0], thresholds[0], neighbor_cutoffs[0], poscutoffs[0]
+threads = int(args.threads)
+integer_depths = args.integer_depths
+edge_list = args.edge_list
+keep_coverage = args.keep_coverage
+cycle_breaking = args.cycle_breaking
+max_cycles = int(args.max_cycles) if len(args.max_cycles) > 0 else None
 
 if output_dir[-1] != '/': output_dir = output_dir+'/'
 if not isdir(output_dir): mkdir(output_dir)
+metrics_prefix = output_dir+prefix+'_' if len(prefix) > 0 else output_dir
+metrics = Metrics(metrics_prefix+'Metrics_Components.tsv' if args.metrics else None, args.quiet, args.metrics, args.resume)
+
+if coverage_list_path != "":
+    if(not isfile(coverage_list_path)):
+        print(coverage_list_path + " file not found")
+        sys.exit(1)
+    if(not isfile(coords_path)):
+        print('Please specify the coordinates of the scaffolds through the "coords" parameter to estimate the abundances of several samples...\n')
+        sys.exit(1)
+    samples = []
+    for line in open(coverage_list_path):
+        sample_path = line.strip()
+        if len(sample_path) == 0:
+            continue
+        head, tail = split(sample_path)
+        sample_prefix = tail.replace(".txt","").replace(".bed","").replace(".bam","")
+        sample_cmd = ""
+        if sample_path.endswith('.bam'):
+            if(not isfile(sample_path)):
+                print(sample_path +" file not found")
+                sys.exit(1)
+            if keep_coverage:
+                sample_path = Get_Coverage_Wrapper("", sample_path, "", contigs_path, coords_path, output_dir, sample_prefix)
+            else:
+                sample_cmd = Get_Coverage_BAM_Command(sample_path, output_dir)
+        elif sample_path.endswith('.bed'):
+            sample_path = Get_Coverage_Wrapper(sample_path, "", "", contigs_path, coords_path, output_dir, sample_prefix)
+        else:
+            sample_path = Get_Coverage_Wrapper("", "", sample_path, contigs_path, coords_path, output_dir, sample_prefix)
+        samples.append((sample_prefix, sample_path, sample_cmd))
+    with metrics.stage('Load_Scaffold_Layout'):
+        layout = Load_Scaffold_Layout(coords_path)
+    with metrics.stage('Estimate_Scaffold_Coverage_Samples') as record:
+        summaries = Estimate_Scaffold_Coverage_Samples(samples, layout, output_dir)
+        record['samples'] = len(samples)
+    with metrics.stage('Join_Summaries'):
+        df_summary = Join_Summaries(summaries, 'binnacle')
+        df_summary.to_csv(output_dir+'Feature-Matrix-binnacle.txt', sep = '\t')
+    print('Written Coverages')
+    if args.metrics: metrics.write(metrics_prefix+'Metrics.json')
+    metrics.close()
+    sys.exit(0)
 
-coverage_path = Get_Coverage_Wrapper(bed_path, bam_path, coverage_path, contigs_path, coords_path, output_dir, prefix)
+coverage_cmd = ""
+if len(bed_path) == 0 and len(bam_path) > 0 and not keep_coverage:
+    if(not isfile(bam_path)):
+        print(bam_path +" file not found")
+        sys.exit(1)
+    coverage_cmd = Get_Coverage_BAM_Command(bam_path, output_dir)
+else:
+    coverage_path = Get_Coverage_Wrapper(bed_path, bam_path, coverage_path, contigs_path, coords_path, output_dir, prefix)
 
 if coords_path == "":
     print('Estimating Abundance from scratch...')
@@ -69,28 +166,57 @@ if coords_path == "":
     if contigs_path == "":
         print('Please specify the path to the contigs.fasta...\n')
         sys.exit(1)
-    G = nx.read_gml(graph_path)
-    node_list = list(G.nodes())
-    df_coverage, df_not_found_summary = Load_Read_Coverage(coverage_path, node_list, output_dir, prefix) 
+    with metrics.stage('Load_Assembly_Graph') as record:
+        G = Load_Assembly_Graph(graph_path)
+        node_list = G.labels
+        record['nodes'], record['edges'] = G.number_of_nodes(), G.number_of_edges()
+    with metrics.stage('Load_Read_Coverage') as record:
+        read_coverage, df_not_found_summary = Load_Sample_Coverage(coverage_path, coverage_cmd, node_list)
+        record['records'] = len(read_coverage['depths'])
     print('Loaded Coverage and Assembly Graph')
-    Write_Coverage_Outputs(G, df_coverage, output_dir, w, t, n, p, prefix)
-    Append_Removed_Contigs(output_dir, df_not_found_summary, prefix)
+    if args.sweep:
+        settings = list(itertools.product(window_sizes, thresholds, neighbor_cutoffs, poscutoffs))
+        with metrics.stage('Write_Coverage_Sweep') as record:
+            setting_dirs = Write_Coverage_Sweep(G, read_coverage, output_dir, settings, prefix, threads, integer_depths, 
+                                                cycle_breaking, max_cycles, edge_list, args.coverage_tracks)
+            record['settings'] = len(settings)
+        for setting_dir in setting_dirs:
+            with metrics.stage('Append_Removed_Contigs'):
+                Append_Removed_Contigs(setting_dir, df_not_found_summary, prefix)
+            with metrics.stage('Write_Scaffolds'):
+                Write_Scaffolds(contigs_path, setting_dir+'Coords_After_Delinking.txt', setting_dir+'Scaffolds.fasta')
+        print('Written the outputs of '+str(len(settings))+' settings')
+        if args.metrics: metrics.write(metrics_prefix+'Metrics.json')
+        metrics.close()
+        sys.exit(0)
+    journal_path = output_dir+'Coverage_Outputs.journal'
+    with metrics.stage('Write_Coverage_Outputs'):
+        Write_Coverage_Outputs(G, read_coverage, output_dir, w, t, n, p, prefix, threads, integer_depths, cycle_breaking, max_cycles, 
+                               edge_list, metrics, journal_path, args.resume, tracks = args.coverage_tracks, 
+                               input_paths = [path for path in [graph_path, args.coverage, bam_path, bed_path, contigs_path] if path != ""])
+    ###Append_Removed_Contigs rewrites the outputs the journal refers to
+    remove(journal_path)
+    with metrics.stage('Append_Removed_Contigs'):
+        Append_Removed_Contigs(output_dir, df_not_found_summary, prefix)
     coords_path = output_dir+'Coords_After_Delinking.txt'
     scaffolds_path = output_dir+'Scaffolds.fasta'
     if(not isfile(coords_path)):
         print("Error Estimating Coordinates")
         sys.exit(1)
-    Write_Scaffolds(contigs_path, coords_path, scaffolds_path)
+    with metrics.stage('Write_Scaffolds'):
+        Write_Scaffolds(contigs_path, coords_path, scaffolds_path)
 else:
     if(not isfile(coords_path)):
         print(coords_path + " file not found")
         sys.exit(1)
-    df_coords = pd.read_csv(coords_path, names = ['cc_aft_dlink', 'cc_bef_dlink', 'Contig', 'Start', 'End', 'Ingraph', 'Length'], 
-                            sep = '\t')
-    df_coords['Contig'] = df_coords['Contig'].astype(str)
-    df_coords_filtered = df_coords[df_coords['Ingraph'] == 1]
-    node_list = df_coords_filtered['Contig'].tolist()
-    df_coverage, df_not_found_summary = Load_Read_Coverage(coverage_path, node_list, output_dir, prefix) 
-    df_summary = Estimate_Scaffold_Coverage_Coords(df_coverage, df_coords_filtered, df_not_found_summary)
-    df_summary.to_csv(output_dir + prefix+'_Summary.txt', sep = '\t', header = False)
+    with metrics.stage('Load_Scaffold_Layout'):
+        layout = Load_Scaffold_Layout(coords_path)
+    with metrics.stage('Load_Read_Coverage') as record:
+        read_coverage, df_not_found_summary = Load_Sample_Coverage(coverage_path, coverage_cmd, layout['contigs'])
+        record['records'] = len(read_coverage['depths'])
+    with metrics.stage('Estimate_Scaffold_Coverage_Coords'):
+        df_summary = Estimate_Scaffold_Coverage_Coords(read_coverage, None, df_not_found_summary, layout)
+        df_summary.to_csv(output_dir + prefix+'_Summary.txt', sep = '\t', header = False)
     print('Written Coverages')
+if args.metrics: metrics.write(metrics_prefix+'Metrics.json')
+metrics.close()
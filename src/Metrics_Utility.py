@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Program developed at Pop lab at the CBCB, University of Maryland by
+Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
+'''
+
+import json
+import time
+import resource
+import contextlib
+from os.path import isfile
+
+Component_Metric_Columns = ['CC_Before_Delinking', 'Nodes', 'Edges', 'Cycle_Edges', 'Delinked', 'Span', 'Mean',
+                            'Cycles_s', 'Coordinates_s', 'Coverage_s', 'Changepoints_s', 'Delinking_s', 'Delinked_s']
+
+def Reset_Peak_Memory():
+    '''
+    Function to reset the peak resident memory of the process, supported on linux only.
+    Output:
+        True if the peak was reset
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def Workers_Peak_Memory():
+    '''
+    Function to return the largest peak resident memory in MB of the child processes that have exited, such as
+    the workers of a process pool, 0 if none has.
+    '''
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss/1024.0
+
+def Peak_Memory():
+    '''
+    Function to return the peak resident memory of the process in MB, since the last Reset_Peak_Memory
+    where supported and since the start of the process otherwise.
+    '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])/1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+
+class Stopwatch:
+    '''
+    Splits the running time of a function into laps.
+    Attributes:
+        times: Dictionary of the seconds spent in every lap
+    '''
+    def __init__(self, laps):
+        self.times = dict((lap, 0.0) for lap in laps)
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        '''
+        Function to add the time since the previous lap to the lap name.
+        '''
+        now = time.perf_counter()
+        self.times[name] += now - self.last
+        self.last = now
+
+class Metrics:
+    '''
+    Collects the running time, peak memory and counters of the stages of a run of binnacle, and the metrics
+    of every connected component.
+    Attributes:
+        stages: Dictionary of the metrics of every stage, in the order the stages were run
+        components: File the metrics of the components are written to as tab separated lines, None to skip them
+        quiet: Do not print the metrics of the stages as they complete
+        memory: Record the peak memory of the stages, the peak of the process is reset at every stage
+        resume: Keep the metrics of the components written by an earlier run, see resume_components
+    '''
+    def __init__(self, components_path=None, quiet=False, memory=False, resume=False):
+        self.stages = {}
+        self.quiet = quiet
+        self.memory = memory
+        self.components = None
+        if components_path is not None:
+            resume = resume and isfile(components_path)
+            self.components = open(components_path, 'a+' if resume else 'w')
+            if not resume:
+                self.components.write('\t'.join(Component_Metric_Columns)+'\n')
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        '''
+        Function to time a stage and record its peak memory, used as a context manager. Counters can be
+        added to the stage while it runs with add. The peak of the worker processes that exit during the stage 
+        is recorded as workers_peak_mb when it exceeds the ones of the workers of earlier stages. 
+        '''
+        if self.memory:
+            Reset_Peak_Memory()
+            workers_peak = Workers_Peak_Memory()
+        record = self.stages.setdefault(name, {})
+        start = time.perf_counter()
+        yield record
+        record['seconds'] = record.get('seconds', 0.0) + time.perf_counter() - start
+        if not self.memory:
+            if not self.quiet:
+                print('Stage '+name+': %.2fs' % record['seconds'])
+            return
+        record['peak_mb'] = max(record.get('peak_mb', 0.0), Peak_Memory())
+        line = 'Stage '+name+': %.2fs, peak memory %.0f MB' % (record['seconds'], record['peak_mb'])
+        if Workers_Peak_Memory() > workers_peak:
+            record['workers_peak_mb'] = max(record.get('workers_peak_mb', 0.0), Workers_Peak_Memory())
+            line += ', workers %.0f MB' % record['workers_peak_mb']
+        if not self.quiet:
+            print(line)
+
+    def add(self, name, key, value):
+        '''
+        Function to add value to the counter key of the stage name.
+        '''
+        record = self.stages.setdefault(name, {})
+        record[key] = record.get(key, 0) + value
+
+    def component(self, values):
+        '''
+        Function to record the metrics of a component, in the order of Component_Metric_Columns.
+        '''
+        if self.components is not None:
+            self.components.write('\t'.join(str(v) for v in values)+'\n')
+
+    def resume_components(self, num_components):
+        '''
+        Function to continue the metrics of the components of an interrupted run, the lines of the components 
+        written after the last commit of the run are dropped as these components are processed again. 
+        Input:
+            num_components: Number of components committed by the run, 0 to start over
+        '''
+        if self.components is None:
+            return
+        self.components.seek(0)
+        offset = 0
+        for i, line in enumerate(iter(self.components.readline, '')):
+            if not line.endswith('\n') or i > num_components:
+                break
+            offset += len(line)
+        self.components.seek(offset)
+        self.components.truncate()
+        if offset == 0:
+            self.components.write('\t'.join(Component_Metric_Columns)+'\n')
+
+    def write(self, metrics_path):
+        '''
+        Function to write the metrics of the stages to a JSON file.
+        '''
+        with open(metrics_path, 'w') as f:
+            json.dump({'stages':self.stages, 'peak_mb':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0,
+                       'workers_peak_mb':Workers_Peak_Memory()}, f, indent = 1)
+
+    def close(self):
+        if self.components is not None:
+            self.components.close()
+            self.components = None
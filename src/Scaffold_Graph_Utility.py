@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Program developed at Pop lab at the CBCB, University of Maryland by
+Harihara Subrahmaniam Muralidharan, Nidhi Shah, Jacquelyn S Meisel.
+'''
+
+import numpy as np
+
+Edge_Orientations = ['EE', 'EB', 'BB', 'BE']
+
+def Gather_Ranges(offsets, ids):
+    '''
+    Function to concatenate the ranges offsets[i]:offsets[i+1] for each i in ids.
+    Input:
+        offsets: Offset table
+        ids: Array of indices into the offset table
+    Output:
+        owner: Position in ids of the range each element belongs to
+        gathered: The concatenated ranges
+    '''
+    first = offsets[ids]
+    counts = offsets[ids+1] - first
+    owner = np.repeat(np.arange(len(ids)), counts)
+    gathered = np.arange(np.sum(counts)) + np.repeat(first - (np.cumsum(counts) - counts), counts)
+    return owner, gathered
+
+class Scaffold_Graph:
+    '''
+    Compact directed graph of the contigs in the assembly graph. Nodes are the integers 0..n-1 indexing the
+    node arrays, edges are stored sorted by their source node so that the out edges of a node are contiguous.
+    Removing an edge clears it in the active mask, the arrays themselves are never modified.
+    Attributes:
+        labels: Contig ids
+        reverse: True for the contigs in the REV orientation
+        length: Length of the contigs
+        sources, targets: Source and target node of the edges
+        orientation: Orientation of the edges, an index into Edge_Orientations
+        overlap: Overlap between the contigs of the edges, int(float(mean))
+        out_offsets: The out edges of node i are out_offsets[i]:out_offsets[i+1]
+        in_edges, in_offsets: The in edges of node i are in_edges[in_offsets[i]:in_offsets[i+1]]
+        active: Mask of the edges that have not been removed
+        edges: Sorted array of the edges of a view, None if the graph is not a view
+        node_ids, edge_ids: Ids of the nodes and edges in the assembly graph the graph was extracted from
+        node_attrs, edge_attrs: Tokens of the attributes in the GML file, indexed by the assembly graph ids
+    '''
+    def __init__(self, labels, reverse, length, sources, targets, orientation, overlap,
+                 node_ids=None, edge_ids=None, node_attrs=None, edge_attrs=None):
+        num_nodes = len(labels)
+        order = np.argsort(sources, kind = 'stable')
+        self.labels = list(labels)
+        self.reverse = np.asarray(reverse, dtype = bool)
+        self.length = np.asarray(length, dtype = np.int64)
+        self.sources = np.asarray(sources, dtype = np.int64)[order]
+        self.targets = np.asarray(targets, dtype = np.int64)[order]
+        self.orientation = np.asarray(orientation, dtype = np.int8)[order]
+        self.overlap = np.asarray(overlap, dtype = np.int64)[order]
+        self.out_offsets = np.concatenate(([0], np.cumsum(np.bincount(self.sources, minlength = num_nodes)))).astype(np.int64)
+        self.in_edges = np.argsort(self.targets, kind = 'stable')
+        self.in_offsets = np.concatenate(([0], np.cumsum(np.bincount(self.targets, minlength = num_nodes)))).astype(np.int64)
+        self.active = np.ones(len(self.sources), dtype = bool)
+        self.edges = None
+        self.node_ids = np.arange(num_nodes) if node_ids is None else np.asarray(node_ids, dtype = np.int64)
+        self.edge_ids = order if edge_ids is None else np.asarray(edge_ids, dtype = np.int64)[order]
+        self.node_attrs = node_attrs
+        self.edge_attrs = edge_attrs
+
+    def number_of_nodes(self):
+        return len(self.labels)
+
+    def active_edges(self):
+        '''
+        Function to return the sorted array of the edges that have not been removed.
+        '''
+        if self.edges is None:
+            return np.flatnonzero(self.active)
+        return self.edges[self.active[self.edges]]
+
+    def number_of_edges(self):
+        return len(self.active_edges())
+
+    def out_edges(self, node):
+        edges = np.arange(self.out_offsets[node], self.out_offsets[node+1])
+        return edges[self.active[edges]]
+
+    def in_edges_of(self, node):
+        edges = self.in_edges[self.in_offsets[node]:self.in_offsets[node+1]]
+        return edges[self.active[edges]]
+
+    def remove_edges(self, edges):
+        self.active[edges] = False
+
+    def copy(self):
+        '''
+        Function to return a copy of the graph that shares the node and edge arrays and has its own edge mask.
+        '''
+        graph = object.__new__(Scaffold_Graph)
+        graph.__dict__.update(self.__dict__)
+        graph.active = self.active.copy()
+        return graph
+
+    def view(self, nodes):
+        '''
+        Function to restrict the graph to the edges between a subset of its nodes, including its removed edges.
+        The view shares the node and edge arrays of the graph, only the edge mask is new and the nodes keep
+        their ids.
+        Input:
+            nodes: Array of nodes
+        Output:
+            graph: A view of the graph
+        '''
+        nodes = np.asarray(nodes, dtype = np.int64)
+        inside = np.zeros(len(self.labels), dtype = bool)
+        inside[nodes] = True
+        owner, edges = Gather_Ranges(self.out_offsets, nodes)
+        graph = object.__new__(Scaffold_Graph)
+        graph.__dict__.update(self.__dict__)
+        graph.edges = edges[inside[self.targets[edges]]]
+        graph.active = np.zeros(len(self.sources), dtype = bool)
+        graph.active[graph.edges] = True
+        return graph
+
+    def active_nodes(self):
+        '''
+        Function to return the sorted array of the nodes incident to an edge that has not been removed.
+        '''
+        edges = self.active_edges()
+        return np.unique(np.concatenate((self.sources[edges], self.targets[edges])))
+
+    def subgraph(self, nodes):
+        '''
+        Function to extract the graph induced by a sorted array of nodes, including its removed edges.
+        Input:
+            nodes: Sorted array of nodes
+        Output:
+            subgraph: A Scaffold_Graph whose node i is nodes[i]
+        '''
+        nodes = np.asarray(nodes, dtype = np.int64)
+        owner, edges = Gather_Ranges(self.out_offsets, nodes)
+        position = np.searchsorted(nodes, self.targets[edges])
+        inside = position < len(nodes)
+        inside[inside] = nodes[position[inside]] == self.targets[edges[inside]]
+        edges = edges[inside]
+        return Scaffold_Graph([self.labels[i] for i in nodes.tolist()], self.reverse[nodes], self.length[nodes],
+                              owner[inside], position[inside], self.orientation[edges], self.overlap[edges],
+                              self.node_ids[nodes], self.edge_ids[edges], self.node_attrs, self.edge_attrs)
+
+def Weakly_Connected_Components(graph):
+    '''
+    Function to return the weakly connected components of the graph, ignoring removed edges. The components are
+    ordered by their first node and the nodes of each component are sorted.
+    Input:
+        graph: A Scaffold_Graph
+    Output:
+        components: List of arrays of nodes
+    '''
+    num_nodes = graph.number_of_nodes()
+    edges = graph.active_edges()
+    sources, targets = graph.sources[edges], graph.targets[edges]
+    ends = np.concatenate((sources, targets))
+    neighbors = np.concatenate((targets, sources))[np.argsort(ends, kind = 'stable')]
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(ends, minlength = num_nodes)))).tolist()
+    neighbors = neighbors.tolist()
+    component = [-1]*num_nodes
+    components = []
+    for root in range(num_nodes):
+        if component[root] >= 0:
+            continue
+        component[root] = root
+        members, stack = [root], [root]
+        while len(stack) > 0:
+            node = stack.pop()
+            for n in neighbors[offsets[node]:offsets[node+1]]:
+                if component[n] < 0:
+                    component[n] = root
+                    members.append(n)
+                    stack.append(n)
+        members.sort()
+        components.append(np.array(members, dtype = np.int64))
+    return components